@@ -1,4 +1,13 @@
 # ai_layer/__init__.py
-from .pipeline import run
+# the pipeline (numpy, rapidfuzz, the vector store, ...) is imported on first use, so
+# lighter modules such as ai_layer.jd_cache can be imported on their own
 
-__all__ = ["run"]
+__all__ = ["run", "tailor_profile", "tailor_profile_async", "tailor_profile_batch", "tailor_profile_batch_async"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        from . import pipeline
+
+        return getattr(pipeline, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
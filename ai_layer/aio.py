@@ -0,0 +1,69 @@
+# event-loop plumbing: async clients bound to the loop they run on, and the one
+# long-lived loop the sync wrappers (tailor_profile, tailor_profile_batch, ...) share
+
+import asyncio
+import threading
+import weakref
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LoopLocal(Generic[T]):
+    """
+    One lazily built object per running event loop. Async HTTP clients pool
+    connections that belong to the loop that opened them; reusing one from another
+    loop (e.g. after asyncio.run returned) fails with "Event loop is closed".
+    Entries go away with their loop.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._by_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, T]" = weakref.WeakKeyDictionary()
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            obj = self._by_loop.get(loop)
+            if obj is None:
+                obj = self._by_loop[loop] = self._factory()
+            return obj
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="ai_layer-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """
+    Run a coroutine on the process-wide background loop and block for its result.
+    Unlike asyncio.run, every call reuses the same loop, so pooled connections
+    (and the per-loop clients above) survive from one sync call to the next.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        if asyncio.iscoroutine(coro):
+            coro.close()
+        raise RuntimeError("run_sync() cannot be called from a running event loop; await the coroutine instead")
+    fut = asyncio.run_coroutine_threadsafe(coro, _background_loop())  # type: ignore[arg-type]
+    try:
+        return fut.result()
+    except BaseException:
+        # e.g. KeyboardInterrupt while waiting: stop the work instead of leaving it running
+        fut.cancel()
+        raise
+
@@ -0,0 +1,173 @@
+# offline runner: JSONL queue of LayerInput records -> tailor_profile -> JSONL results, resumable
+#
+#   python -m ai_layer.batch_runner queue.jsonl --out results.jsonl --workers 8
+#
+# Each queue line is a LayerInput, optionally with an "id"; records without one are
+# identified by a hash of their content. Completed ids are appended to a checkpoint
+# file (default: <out>.done), so re-running the same command after a crash skips them.
+# All workers run in one process and share the module-level chat/embedding rate limiters.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+from typing import Any, Dict, Iterator, Optional, Set, TextIO, Tuple
+from .models import LayerInput
+from .pipeline import tailor_profile_async, PIPELINE_CONCURRENCY, REWRITE_STRATEGY
+from .ratelimit import chat_limiter, embed_limiter
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+# seconds between progress lines
+BATCH_PROGRESS_EVERY = float(os.getenv("BATCH_PROGRESS_EVERY", "10"))
+
+
+def record_id(record: Dict[str, Any]) -> str:
+    rid = record.get("id")
+    if rid is not None:
+        return str(rid)
+    body = json.dumps(record, sort_keys=True, default=str)
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+def read_queue(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                yield record_id(record), record
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+class Progress:
+    """Throughput / ETA bookkeeping for one run."""
+
+    def __init__(self, total: int, skipped: int, stream: TextIO = sys.stderr):
+        self.total = total
+        self.skipped = skipped
+        self.ok = 0
+        self.failed = 0
+        self.stream = stream
+        self.start = time.monotonic()
+        self._last_print = self.start
+
+    def line(self) -> str:
+        done = self.ok + self.failed
+        elapsed = time.monotonic() - self.start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        left = self.total - done
+        eta = f"{left / rate:,.0f}s" if rate > 0 else "?"
+        return (
+            f"[batch] {done}/{self.total} done ({self.ok} ok, {self.failed} failed, {self.skipped} skipped)"
+            f" | {rate:.2f} jobs/s | elapsed {elapsed:,.0f}s | eta {eta}"
+        )
+
+    def tick(self, every: float) -> None:
+        now = time.monotonic()
+        if now - self._last_print >= every:
+            self._last_print = now
+            print(self.line(), file=self.stream, flush=True)
+
+
+async def run_batch(
+    queue_path: str,
+    out_path: str,
+    checkpoint_path: Optional[str] = None,
+    workers: int = BATCH_WORKERS,
+    concurrency: int = PIPELINE_CONCURRENCY,
+    strategy: str = REWRITE_STRATEGY,
+    progress_every: float = BATCH_PROGRESS_EVERY,
+) -> Progress:
+    """
+    Process every queued record not yet in the checkpoint with `workers` concurrent
+    pipeline runs. A result line ({"id", "status": "ok", "output"}) is written and
+    flushed before its id is checkpointed; failures are written with status "error"
+    and left out of the checkpoint so the next run retries them.
+    """
+    checkpoint_path = checkpoint_path or out_path + ".done"
+    done_ids = load_checkpoint(checkpoint_path)
+    todo = []
+    skipped = 0
+    for rid, record in read_queue(queue_path):
+        if rid in done_ids:
+            skipped += 1
+        else:
+            todo.append((rid, record))
+    progress = Progress(len(todo), skipped)
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in todo:
+        queue.put_nowait(item)
+
+    with open(out_path, "a", encoding="utf-8") as out, open(checkpoint_path, "a", encoding="utf-8") as ckpt:
+
+        def _write(row: Dict[str, Any]) -> None:
+            out.write(json.dumps(row, default=str) + "\n")
+            out.flush()
+
+        async def _worker() -> None:
+            while True:
+                try:
+                    rid, record = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    payload = LayerInput(**{k: v for k, v in record.items() if k != "id"})
+                    result = await tailor_profile_async(payload, concurrency=concurrency, strategy=strategy)
+                except Exception as e:
+                    _write({"id": rid, "status": "error", "error": f"{type(e).__name__}: {e}"})
+                    progress.failed += 1
+                else:
+                    _write({"id": rid, "status": "ok", "output": result.model_dump()})
+                    ckpt.write(rid + "\n")
+                    ckpt.flush()
+                    os.fsync(ckpt.fileno())
+                    progress.ok += 1
+                progress.tick(progress_every)
+
+        await asyncio.gather(*(_worker() for _ in range(max(1, workers))))
+    print(progress.line(), file=progress.stream, flush=True)
+    return progress
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run queued tailoring jobs (JSONL of LayerInput) through the pipeline.")
+    parser.add_argument("queue", help="input JSONL, one LayerInput per line (optional 'id')")
+    parser.add_argument("--out", required=True, help="output JSONL (appended)")
+    parser.add_argument("--checkpoint", help="file of completed ids (default: <out>.done)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="concurrent pipeline runs")
+    parser.add_argument("--concurrency", type=int, default=PIPELINE_CONCURRENCY, help="in-flight calls per run")
+    parser.add_argument("--strategy", default=REWRITE_STRATEGY, choices=["single", "batch"])
+    parser.add_argument("--chat-rpm", type=int, help="chat requests/minute, shared by all workers")
+    parser.add_argument("--chat-tpm", type=int, help="chat tokens/minute, shared by all workers")
+    parser.add_argument("--embed-rpm", type=int, help="embedding requests/minute, shared by all workers")
+    parser.add_argument("--embed-tpm", type=int, help="embedding tokens/minute, shared by all workers")
+    parser.add_argument("--progress-every", type=float, default=BATCH_PROGRESS_EVERY, help="seconds between stats lines")
+    args = parser.parse_args(argv)
+
+    chat_limiter.configure(args.chat_rpm, args.chat_tpm)
+    embed_limiter.configure(args.embed_rpm, args.embed_tpm)
+    progress = asyncio.run(
+        run_batch(
+            args.queue,
+            args.out,
+            args.checkpoint,
+            workers=args.workers,
+            concurrency=args.concurrency,
+            strategy=args.strategy,
+            progress_every=args.progress_every,
+        )
+    )
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
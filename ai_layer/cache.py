@@ -0,0 +1,265 @@
+# two-tier key/value cache (in-process LRU + SQLite on disk)
+
+import os
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CACHE_DIR = os.getenv("AI_LAYER_CACHE_DIR", ".cache/ai_layer")
+
+
+class LRUCache:
+    """Thread-safe, size-bounded in-process LRU map."""
+
+    def __init__(self, max_items: int = 10000):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[object]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: str, value: object) -> None:
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    SQLite-backed store of bytes values.
+    Evicts least-recently-accessed rows once max_items is exceeded.
+    """
+
+    def __init__(self, path: str, max_items: int = 500000, table: str = "kv"):
+        self.path = path
+        self.max_items = max_items
+        self.table = table
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # opened on first use (callers hold self._lock), so importing a module that
+        # declares a cache creates no directory or file
+        if self._db is None:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table}(accessed)")
+            self._db = conn
+        return self._db
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[bytes, float]]:
+        """Return {key: (value, created)} for the keys present on disk."""
+        out: Dict[str, Tuple[bytes, float]] = {}
+        if not keys:
+            return out
+        now = time.time()
+        with self._lock:
+            # sqlite caps host parameters; stay well below the limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created FROM {self.table} WHERE key IN ({marks})", chunk
+                ).fetchall()
+                for k, v, c in rows:
+                    out[k] = (v, c)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE {self.table} SET accessed=? WHERE key IN ({','.join('?' * len(rows))})",
+                        [now] + [r[0] for r in rows],
+                    )
+        return out
+
+    def put_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        now = time.time()
+        rows = [(k, v, now, now) for k, v in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created, accessed) VALUES (?, ?, ?, ?)", rows
+            )
+            self._writes += len(rows)
+            # checking the row count on every write is wasteful; do it periodically
+            if self._writes >= max(1, self.max_items // 100):
+                self._writes = 0
+                self._evict()
+
+    def delete_many(self, keys: List[str]) -> None:
+        if not keys:
+            return
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        excess = count - self.max_items
+        if excess > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed ASC LIMIT ?)",
+                (excess,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+
+class TieredCache:
+    """
+    In-process LRU in front of an optional SQLite store.
+    Values are serialized with encode/decode only when they touch the disk tier.
+    Keeps hit/miss counters per tier for monitoring.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        encode,
+        decode,
+        memory_items: int = 10000,
+        disk_items: int = 500000,
+        disk_path: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.name = name
+        self._encode = encode
+        self._decode = decode
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(memory_items)
+        self.disk = DiskCache(disk_path, max_items=disk_items, table=name) if disk_path else None
+        self._stats_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        if n:
+            with self._stats_lock:
+                self.stats[key] += n
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def _get_memory(self, keys: List[str]) -> Tuple[Dict[str, object], List[str]]:
+        """(values found in memory, keys left for the disk tier)."""
+        found: Dict[str, object] = {}
+        pending = []
+        for k in keys:
+            entry = self.memory.get(k)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created):
+                    found[k] = value
+                    continue
+                self.memory.delete(k)
+            pending.append(k)
+        self._count("memory_hits", len(found))
+        return found, pending
+
+    def _get_disk(self, pending: List[str]) -> Dict[str, object]:
+        found: Dict[str, object] = {}
+        if not pending or self.disk is None:
+            return found
+        expired = []
+        for k, (blob, created) in self.disk.get_many(pending).items():
+            if self._expired(created):
+                expired.append(k)
+                continue
+            value = self._decode(blob)
+            found[k] = value
+            self.memory.put(k, (value, created))
+            self._count("disk_hits")
+        self.disk.delete_many(expired)
+        return found
+
+    def get_many(self, keys: List[str]) -> Dict[str, object]:
+        """Return {key: value} for every cached key; missing keys are simply absent."""
+        found, pending = self._get_memory(keys)
+        found.update(self._get_disk(pending))
+        self._count("misses", len(keys) - len(found))
+        return found
+
+    async def get_many_async(self, keys: List[str]) -> Dict[str, object]:
+        """get_many for event-loop callers: memory hits are served inline, the SQLite tier in a worker thread."""
+        found, pending = self._get_memory(keys)
+        if pending and self.disk is not None:
+            found.update(await asyncio.to_thread(self._get_disk, pending))
+        self._count("misses", len(keys) - len(found))
+        return found
+
+    def get(self, key: str) -> Optional[object]:
+        return self.get_many([key]).get(key)
+
+    def _put_memory(self, items: Dict[str, object]) -> None:
+        now = time.time()
+        for k, v in items.items():
+            self.memory.put(k, (v, now))
+        self._count("writes", len(items))
+
+    def _put_disk(self, items: Dict[str, object]) -> None:
+        if self.disk is not None:
+            self.disk.put_many((k, self._encode(v)) for k, v in items.items())
+
+    def put_many(self, items: Dict[str, object]) -> None:
+        self._put_memory(items)
+        self._put_disk(items)
+
+    async def put_many_async(self, items: Dict[str, object]) -> None:
+        """put_many for event-loop callers; the SQLite write (and any eviction) runs in a worker thread."""
+        self._put_memory(items)
+        if items and self.disk is not None:
+            await asyncio.to_thread(self._put_disk, items)
+
+    def put(self, key: str, value: object) -> None:
+        self.put_many({key: value})
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats, memory_items=len(self.memory))
+
+
+def default_disk_path(filename: str) -> Optional[str]:
+    """Resolve a file inside CACHE_DIR; an empty CACHE_DIR disables the disk tier."""
+    if not CACHE_DIR:
+        return None
+    return os.path.join(CACHE_DIR, filename)
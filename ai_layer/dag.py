@@ -0,0 +1,73 @@
+# minimal async stage graph: every stage starts as soon as the stages it depends on finish
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Sequence, Tuple
+from .tracing import span
+
+
+class Stage(NamedTuple):
+    """`fn` is awaited with the results of `deps`, in order, as positional arguments."""
+
+    name: str
+    fn: Callable[..., Awaitable[Any]]
+    deps: Tuple[str, ...] = ()
+
+
+def _topological(stages: Sequence[Stage]) -> List[Stage]:
+    by_name = {s.name: s for s in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("duplicate stage names")
+    for s in stages:
+        for d in s.deps:
+            if d not in by_name:
+                raise ValueError(f"stage {s.name!r} depends on unknown stage {d!r}")
+    order: List[Stage] = []
+    done: set = set()
+    pending = list(stages)
+    while pending:
+        ready = [s for s in pending if all(d in done for d in s.deps)]
+        if not ready:
+            raise ValueError("stage graph has a cycle: " + ", ".join(s.name for s in pending))
+        for s in ready:
+            order.append(s)
+            done.add(s.name)
+        pending = [s for s in pending if s.name not in done]
+    return order
+
+
+async def run_stages(stages: Sequence[Stage]) -> Dict[str, Any]:
+    """
+    Run a DAG of async stages with maximal overlap, so wall time approaches the
+    critical path. Each stage is timed as a trace span from the moment its inputs
+    are ready. The first failure cancels every unfinished stage and is re-raised;
+    cancelling the caller cancels them too. Returns each stage's result by name.
+    """
+    tasks: Dict[str, "asyncio.Task[Any]"] = {}
+
+    def _start(stage: Stage) -> "asyncio.Task[Any]":
+        deps = [tasks[d] for d in stage.deps]
+
+        async def _run() -> Any:
+            args = [await d for d in deps]
+            with span(stage.name):
+                return await stage.fn(*args)
+
+        return asyncio.ensure_future(_run())
+
+    for stage in _topological(stages):
+        tasks[stage.name] = _start(stage)
+
+    try:
+        done, _ = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+        failed = [t for t in done if not t.cancelled() and t.exception() is not None]
+        if failed:
+            raise failed[0].exception()  # type: ignore[misc]
+    finally:
+        # on failure, or when the caller is cancelled (a closed stream, run_sync
+        # interrupted), no stage may keep running and spending budget on its own
+        pending = [t for t in tasks.values() if not t.done()]
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    return {name: t.result() for name, t in tasks.items()}
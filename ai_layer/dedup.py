@@ -0,0 +1,123 @@
+# near-duplicate bullet grouping: exact fingerprints, SimHash, optional embedding check
+
+import os
+import re
+import hashlib
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+import numpy as np
+from .embeddings import bullet_fingerprint
+from .lexical import tokenize
+from .utils import extract_technologies, similarity_matrix
+
+# bullets whose 64-bit SimHashes differ in at most this many bits are near-duplicates
+DEDUP_MAX_HAMMING = int(os.getenv("DEDUP_MAX_HAMMING", "3"))
+# ...as are bullets whose embeddings are at least this similar (when vectors are known)
+DEDUP_SIM_THRESHOLD = float(os.getenv("DEDUP_SIM_THRESHOLD", "0.97"))
+
+_NUM_RE = re.compile(r"\d+(?:[.,]\d+)*")
+_BITS = 64
+
+
+def _features(text: str) -> List[str]:
+    words = tokenize(text)
+    return words + [a + " " + b for a, b in zip(words, words[1:])]
+
+
+def _facts(text: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    # what a copied rewrite would assert: technologies and figures must agree exactly
+    return frozenset(extract_technologies(text)), frozenset(_NUM_RE.findall(text))
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over content words and their bigrams; similar texts differ in few bits."""
+    acc = [0] * _BITS
+    for f in _features(text):
+        h = int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big")
+        for b in range(_BITS):
+            acc[b] += 1 if (h >> b) & 1 else -1
+    return sum(1 << b for b in range(_BITS) if acc[b] > 0)
+
+
+class _DisjointSet:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # the lower index stays root so it becomes the group's representative
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def group_near_duplicates(
+    texts: Sequence[str],
+    vectors: Optional[Sequence[Optional[List[float]]]] = None,
+    max_hamming: int = DEDUP_MAX_HAMMING,
+    sim_threshold: float = DEDUP_SIM_THRESHOLD,
+) -> List[List[int]]:
+    """
+    Partition texts into groups of duplicates. Identical bullets (same bullet_fingerprint)
+    always share a group; distinct ones join when their SimHashes are within max_hamming
+    bits or, where both vectors are given, their cosine similarity reaches sim_threshold,
+    provided they name the same technologies and figures (a copied rewrite carries both).
+    Each group lists indices in ascending order, so its first index is the representative;
+    groups are ordered by that index.
+    """
+    n = len(texts)
+    ds = _DisjointSet(n)
+
+    by_fp: Dict[str, int] = {}
+    for i, t in enumerate(texts):
+        fp = bullet_fingerprint(t)
+        if fp in by_fp:
+            ds.union(by_fp[fp], i)
+        else:
+            by_fp[fp] = i
+    uniq = sorted(by_fp.values())
+    facts = {i: _facts(texts[i]) for i in uniq}
+
+    def _join(a: int, b: int) -> None:
+        if facts[a] == facts[b]:
+            ds.union(a, b)
+
+    # SimHash: split into max_hamming + 1 bands; by pigeonhole, any pair within
+    # max_hamming bits agrees exactly on at least one band, so only band mates are compared
+    if max_hamming >= 0 and len(uniq) > 1:
+        hashes = {i: simhash(texts[i]) for i in uniq}
+        bands = max_hamming + 1
+        width = _BITS // bands
+        seen = set()
+        for b in range(bands):
+            mask = ((1 << width) - 1) << (b * width)
+            buckets: Dict[int, List[int]] = {}
+            for i in uniq:
+                buckets.setdefault(hashes[i] & mask, []).append(i)
+            for members in buckets.values():
+                for x in range(len(members)):
+                    for y in range(x + 1, len(members)):
+                        pair = (members[x], members[y])
+                        if pair in seen:
+                            continue
+                        seen.add(pair)
+                        if bin(hashes[pair[0]] ^ hashes[pair[1]]).count("1") <= max_hamming:
+                            _join(*pair)
+
+    # embeddings: one similarity matrix over the distinct texts that have a vector
+    if vectors is not None and sim_threshold <= 1.0:
+        have = [i for i in uniq if vectors[i]]
+        if len(have) > 1:
+            sims = similarity_matrix([vectors[i] for i in have], [vectors[i] for i in have])
+            rows, cols = np.nonzero(np.triu(sims >= sim_threshold, k=1))
+            for r, c in zip(rows.tolist(), cols.tolist()):
+                _join(have[r], have[c])
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(n):
+        groups.setdefault(ds.find(i), []).append(i)
+    return [groups[r] for r in sorted(groups)]
@@ -1,20 +1,205 @@
-# OpenAI embeddings + backoff
+# OpenAI embeddings + backoff + content-addressed cache
 
 import os
+import asyncio
 import hashlib
-from typing import List
+import contextvars
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
 from tenacity import retry, wait_exponential_jitter, stop_after_attempt
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from .aio import LoopLocal
+from .cache import TieredCache, default_disk_path
+from .ratelimit import embed_limiter
+from .tracing import count, note_retry, record_usage, usage_tokens
 
 _EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+EMBED_MODEL = _EMBED_MODEL
 client = OpenAI()
+# async clients are per event loop: their connection pools cannot cross loops
+aclients: LoopLocal[AsyncOpenAI] = LoopLocal(AsyncOpenAI)
 
-@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(5))
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    # Batch in one call when possible
+# cache sizing (set EMBED_CACHE_DISK_ITEMS=0 to keep the cache in-process only)
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "20000"))
+EMBED_CACHE_DISK_ITEMS = int(os.getenv("EMBED_CACHE_DISK_ITEMS", "500000"))
+
+# per-request limits (provider caps: 2048 inputs, ~300k tokens, 8191 tokens per input)
+EMBED_MAX_BATCH_ITEMS = int(os.getenv("EMBED_MAX_BATCH_ITEMS", "256"))
+EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "100000"))
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "4"))
+
+
+def _encode_vec(vec: List[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def _decode_vec(blob: bytes) -> List[float]:
+    a = array("f")
+    a.frombytes(blob)
+    return a.tolist()
+
+
+embedding_cache = TieredCache(
+    "embeddings",
+    encode=_encode_vec,
+    decode=_decode_vec,
+    memory_items=EMBED_CACHE_MEMORY_ITEMS,
+    disk_items=EMBED_CACHE_DISK_ITEMS,
+    disk_path=default_disk_path("embeddings.sqlite") if EMBED_CACHE_DISK_ITEMS > 0 else None,
+)
+
+
+def bullet_fingerprint(text: str) -> str:
+    return hashlib.sha1(text.strip().encode("utf-8")).hexdigest()
+
+
+def jd_fingerprint(text: str) -> str:
+    # case and whitespace differences between re-posted JDs should not change the key
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+def _cache_key(text: str, model: str = _EMBED_MODEL) -> str:
+    return f"{model}:{bullet_fingerprint(text)}"
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token for English; errs on the high side for short strings
+    return len(text) // 4 + 1
+
+
+def chunk_by_tokens(
+    texts: List[str], max_items: int = EMBED_MAX_BATCH_ITEMS, max_tokens: int = EMBED_MAX_BATCH_TOKENS
+) -> List[List[int]]:
+    """Greedily split texts into chunks of indices that respect both item and token budgets."""
+    chunks: List[List[int]] = []
+    cur: List[int] = []
+    cur_tokens = 0
+    for i, t in enumerate(texts):
+        n = estimate_tokens(t)
+        if cur and (len(cur) >= max_items or cur_tokens + n > max_tokens):
+            chunks.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append(i)
+        cur_tokens += n
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def _record(resp, texts: List[str]) -> None:
+    record_usage("embed", _EMBED_MODEL, usage_tokens(resp, sum(estimate_tokens(t) for t in texts))[0])
+
+
+@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(5), before_sleep=note_retry)
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    embed_limiter.acquire_blocking(sum(estimate_tokens(t) for t in texts))
     resp = client.embeddings.create(model=_EMBED_MODEL, input=texts)
+    _record(resp, texts)
     return [d.embedding for d in resp.data]
 
 
-def bullet_fingerprint(text: str) -> str:
-    return hashlib.sha1(text.strip().encode("utf-8")).hexdigest()
\ No newline at end of file
+def _embed_uncached(texts: List[str]) -> List[List[float]]:
+    """
+    Send texts upstream in token-bounded chunks, concurrently.
+    Each chunk retries on its own, so a failure never re-sends the whole input.
+    """
+    chunks = chunk_by_tokens(texts)
+    if len(chunks) == 1:
+        return _embed_batch(texts)
+
+    out: List[List[float]] = [None] * len(texts)  # type: ignore[list-item]
+    workers = max(1, min(EMBED_MAX_WORKERS, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # each chunk runs in a copy of the caller's context so it reports into the active trace
+        results = [pool.submit(contextvars.copy_context().run, _embed_batch, [texts[i] for i in c]) for c in chunks]
+        for chunk, fut in zip(chunks, results):
+            vectors = fut.result()
+            for i, vec in zip(chunk, vectors):
+                out[i] = vec
+    return out
+
+
+def _lookup(texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], Dict[str, str]]:
+    """Return (keys, cached vectors by key, uncached texts by key)."""
+    keys = [_cache_key(t) for t in texts]
+    return _split(keys, texts, embedding_cache.get_many(list(dict.fromkeys(keys))))
+
+
+async def _lookup_async(texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], Dict[str, str]]:
+    keys = [_cache_key(t) for t in texts]
+    return _split(keys, texts, await embedding_cache.get_many_async(list(dict.fromkeys(keys))))
+
+
+def _split(
+    keys: List[str], texts: List[str], found: Dict[str, List[float]]
+) -> Tuple[List[str], Dict[str, List[float]], Dict[str, str]]:
+    missing: Dict[str, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in found and k not in missing:
+            missing[k] = t
+    count("embed_cache_hits", len(found))
+    return keys, found, missing
+
+
+def _store(found: Dict[str, List[float]], missing: Dict[str, str], vectors: List[List[float]]) -> None:
+    fresh = dict(zip(missing.keys(), vectors))
+    embedding_cache.put_many(fresh)
+    found.update(fresh)
+
+
+async def _store_async(found: Dict[str, List[float]], missing: Dict[str, str], vectors: List[List[float]]) -> None:
+    fresh = dict(zip(missing.keys(), vectors))
+    await embedding_cache.put_many_async(fresh)
+    found.update(fresh)
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Embed texts, consulting the embedding cache first.
+    Only texts missing from the cache are sent upstream (deduplicated, chunked by token budget).
+    """
+    if not texts:
+        return []
+    keys, found, missing = _lookup(texts)
+    if missing:
+        _store(found, missing, _embed_uncached(list(missing.values())))
+    return [found[k] for k in keys]
+
+
+@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(5), before_sleep=note_retry)
+async def _embed_batch_async(texts: List[str]) -> List[List[float]]:
+    await embed_limiter.acquire(sum(estimate_tokens(t) for t in texts))
+    resp = await aclients.get().embeddings.create(model=_EMBED_MODEL, input=texts)
+    _record(resp, texts)
+    return [d.embedding for d in resp.data]
+
+
+async def _embed_uncached_async(texts: List[str]) -> List[List[float]]:
+    chunks = chunk_by_tokens(texts)
+    sem = asyncio.Semaphore(max(1, EMBED_MAX_WORKERS))
+
+    async def _one(chunk: List[int]) -> List[List[float]]:
+        async with sem:
+            return await _embed_batch_async([texts[i] for i in chunk])
+
+    results = await asyncio.gather(*(_one(c) for c in chunks))
+    out: List[List[float]] = [None] * len(texts)  # type: ignore[list-item]
+    for chunk, vectors in zip(chunks, results):
+        for i, vec in zip(chunk, vectors):
+            out[i] = vec
+    return out
+
+
+async def embed_texts_async(texts: List[str]) -> List[List[float]]:
+    """Async twin of embed_texts; shares the same cache, whose SQLite tier is read and written off the loop."""
+    if not texts:
+        return []
+    keys, found, missing = await _lookup_async(texts)
+    if missing:
+        await _store_async(found, missing, await _embed_uncached_async(list(missing.values())))
+    return [found[k] for k in keys]
+
+
+def embedding_cache_stats() -> Dict[str, int]:
+    return embedding_cache.snapshot()
@@ -0,0 +1,177 @@
+# job description preprocessing, computed once per normalized JD text and shared by
+# job_analyzer (LLM analysis) and the pipeline (keywords + embedding)
+
+import os
+import re
+import json
+import asyncio
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from .cache import TieredCache, default_disk_path
+from .embeddings import EMBED_MODEL, embed_texts, embed_texts_async, jd_fingerprint, _encode_vec, _decode_vec
+from .tracing import count
+
+# popular postings are re-posted and re-submitted for days; entries expire after JD_CACHE_TTL seconds
+JD_CACHE_TTL = float(os.getenv("JD_CACHE_TTL", str(3 * 24 * 3600)))
+JD_CACHE_MEMORY_ITEMS = int(os.getenv("JD_CACHE_MEMORY_ITEMS", "5000"))
+JD_CACHE_DISK_ITEMS = int(os.getenv("JD_CACHE_DISK_ITEMS", "200000"))
+JD_MAX_KEYWORDS = 50
+
+# analysis JSON and keyword lists
+jd_cache = TieredCache(
+    "jd",
+    encode=lambda v: json.dumps(v).encode("utf-8"),
+    decode=lambda b: json.loads(b.decode("utf-8")),
+    memory_items=JD_CACHE_MEMORY_ITEMS,
+    disk_items=JD_CACHE_DISK_ITEMS,
+    disk_path=default_disk_path("jd.sqlite") if JD_CACHE_DISK_ITEMS > 0 else None,
+    ttl_seconds=JD_CACHE_TTL,
+)
+# JD embeddings, keyed by normalized text (the embedding cache keys by exact text)
+jd_vector_cache = TieredCache(
+    "jd_vectors",
+    encode=_encode_vec,
+    decode=_decode_vec,
+    memory_items=JD_CACHE_MEMORY_ITEMS,
+    disk_items=JD_CACHE_DISK_ITEMS,
+    disk_path=default_disk_path("jd_vectors.sqlite") if JD_CACHE_DISK_ITEMS > 0 else None,
+    ttl_seconds=JD_CACHE_TTL,
+)
+
+
+def extract_jd_keywords(jd_text: str) -> List[str]:
+    """Comma / line separated phrases of the JD, in order, without duplicates."""
+    seen = set()
+    out = []
+    for w in re.split(r"[,\n]", jd_text):
+        w = w.strip()
+        if len(w) > 2 and w.lower() not in seen:
+            seen.add(w.lower())
+            out.append(w)
+    return out[:JD_MAX_KEYWORDS]
+
+
+class _SingleFlight:
+    """Per-key locks so concurrent misses for one JD compute it once (sync callers)."""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def lock(self, key: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def release(self, key: str) -> None:
+        with self._guard:
+            lk = self._locks.get(key)
+            if lk is not None and not lk.locked():
+                del self._locks[key]
+
+
+_flight = _SingleFlight()
+# (event loop id, key) -> (in-flight embedding request, position), so concurrent async misses share one request
+_inflight: Dict[Tuple[int, str], Tuple["asyncio.Future[List[List[float]]]", int]] = {}
+
+
+def _get_or_compute(key: str, compute: Callable[[], object]) -> object:
+    hit = jd_cache.get(key)
+    if hit is not None:
+        count("jd_cache_hits")
+        return hit
+    lk = _flight.lock(key)
+    with lk:
+        hit = jd_cache.get(key)
+        if hit is None:
+            hit = compute()
+            jd_cache.put(key, hit)
+        else:
+            count("jd_cache_hits")
+    _flight.release(key)
+    return hit
+
+
+def jd_analysis(jd_text: str, analyze: Callable[[str], str], model: Optional[str] = None) -> str:
+    """
+    Structured LLM analysis of a JD (the raw JSON string `analyze` returns), computed
+    once per normalized text and model within JD_CACHE_TTL.
+    """
+    key = f"analysis:{model}:{jd_fingerprint(jd_text)}"
+    return _get_or_compute(key, lambda: analyze(jd_text))  # type: ignore[return-value]
+
+
+def jd_keywords(jd_text: str) -> List[str]:
+    key = f"keywords:{jd_fingerprint(jd_text)}"
+    return _get_or_compute(key, lambda: extract_jd_keywords(jd_text))  # type: ignore[return-value]
+
+
+def _vector_key(jd_text: str) -> str:
+    return f"{EMBED_MODEL}:{jd_fingerprint(jd_text)}"
+
+
+def jd_embedding(jd_text: str) -> List[float]:
+    return jd_embeddings([jd_text])[0]
+
+
+def jd_embeddings(jd_texts: List[str]) -> List[List[float]]:
+    """Embeddings of many JDs; misses go upstream in one embed_texts call."""
+    keys = [_vector_key(t) for t in jd_texts]
+    found = jd_vector_cache.get_many(list(dict.fromkeys(keys)))
+    count("jd_cache_hits", len(found))
+    missing = {k: t for k, t in zip(keys, jd_texts) if k not in found}
+    if missing:
+        fresh = dict(zip(missing, embed_texts(list(missing.values()))))
+        jd_vector_cache.put_many(fresh)
+        found.update(fresh)
+    return [found[k] for k in keys]  # type: ignore[misc]
+
+
+async def jd_embedding_async(jd_text: str) -> List[float]:
+    return (await jd_embeddings_async([jd_text]))[0]
+
+
+async def jd_embeddings_async(jd_texts: List[str]) -> List[List[float]]:
+    """
+    Async twin of jd_embeddings. Concurrent requests for a JD that is already being
+    embedded in this event loop await that request instead of sending their own.
+    """
+    keys = [_vector_key(t) for t in jd_texts]
+    found: Dict[str, List[float]] = await jd_vector_cache.get_many_async(list(dict.fromkeys(keys)))  # type: ignore[assignment]
+    count("jd_cache_hits", len(found))
+    loop_id = id(asyncio.get_running_loop())
+    waiting: Dict[str, Tuple["asyncio.Future[List[List[float]]]", int]] = {}
+    missing: Dict[str, str] = {}
+    for k, t in zip(keys, jd_texts):
+        if k in found or k in waiting or k in missing:
+            continue
+        flight = _inflight.get((loop_id, k))
+        if flight is not None:
+            waiting[k] = flight
+        else:
+            missing[k] = t
+
+    if missing:
+
+        async def _embed() -> List[List[float]]:
+            vecs = await embed_texts_async(list(missing.values()))
+            await jd_vector_cache.put_many_async(dict(zip(missing, vecs)))
+            return vecs
+
+        # the request belongs to no caller: everyone awaits it through shield, so a
+        # cancelled caller (e.g. a disconnected stream) never cancels it for the others
+        batch = asyncio.ensure_future(_embed())
+        for pos, k in enumerate(missing):
+            _inflight[(loop_id, k)] = waiting[k] = (batch, pos)
+
+        def _landed(fut: "asyncio.Future[List[List[float]]]") -> None:
+            for k in missing:
+                if _inflight.get((loop_id, k), (None, 0))[0] is fut:
+                    del _inflight[(loop_id, k)]
+            if not fut.cancelled():
+                fut.exception()  # retrieved here in case every caller was cancelled
+
+        batch.add_done_callback(_landed)
+
+    for k, (fut, pos) in waiting.items():
+        found[k] = (await asyncio.shield(fut))[pos]
+    return [found[k] for k in keys]
@@ -0,0 +1,118 @@
+# per-namespace BM25 inverted index + reciprocal-rank fusion
+
+import os
+import re
+import json
+import math
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from .cache import LRUCache
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+# common words that carry no signal in JD/bullet matching
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or our the to we will with you your "
+    "experience work working team using use strong ability".split()
+)
+
+# standard RRF damping constant
+RRF_K = 60
+# namespaces whose index stays in memory; an evicted one is rebuilt on its next ingest
+LEXICAL_INDEX_ITEMS = int(os.getenv("LEXICAL_INDEX_ITEMS", "1000"))
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a small document set (one user's bullets), plus a forward term index."""
+
+    def __init__(self, items: Sequence[Tuple[str, str, Dict[str, Any]]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.terms: List[frozenset] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        for i, (vid, text, md) in enumerate(items):
+            toks = tokenize(text)
+            tf = Counter(toks)
+            self.ids.append(vid)
+            md2 = dict(md)
+            md2["_text"] = md2.get("_text") or text
+            self.metadata.append(md2)
+            self.terms.append(frozenset(tf))
+            self.lengths.append(len(toks))
+            for term, n in tf.items():
+                self.postings.setdefault(term, []).append((i, n))
+        self.pos = {vid: i for i, vid in enumerate(self.ids)}
+        self.avg_len = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def idf(self, term: str) -> float:
+        n = len(self.ids)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query_terms: Iterable[str], top_k: int) -> List[Tuple[str, float]]:
+        """Return up to top_k (id, score) pairs, best first; documents with no term hit are skipped."""
+        scores: Dict[int, float] = {}
+        avg = self.avg_len or 1.0
+        for term in set(query_terms):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf(term)
+            for i, tf in plist:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[i] / avg)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / norm
+        best = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:top_k]
+        return [(self.ids[i], s) for i, s in best]
+
+    def coverage(self, doc_id: str, keyword_terms: Sequence[frozenset]) -> float:
+        """
+        Mean fraction of each JD keyword's terms present in the document.
+        A set lookup per term; replaces fuzzy matching for retrieval scoring.
+        """
+        i = self.pos.get(doc_id)
+        if i is None or not keyword_terms:
+            return 0.0
+        doc = self.terms[i]
+        total = 0.0
+        for kt in keyword_terms:
+            if kt:
+                total += len(kt & doc) / len(kt)
+        return total / len(keyword_terms)
+
+
+def keyword_term_sets(jd_keywords: List[str]) -> List[frozenset]:
+    return [frozenset(tokenize(k)) for k in jd_keywords]
+
+
+_indexes = LRUCache(LEXICAL_INDEX_ITEMS)
+
+
+def index_namespace(namespace: str, items: Sequence[Tuple[str, str, Dict[str, Any]]]) -> BM25Index:
+    """Build (or keep, when the items are unchanged) the lexical index for a namespace."""
+    sig = hash(tuple((vid, text, json.dumps(md, sort_keys=True, default=str)) for vid, text, md in items))
+    cur = _indexes.get(namespace)
+    if cur is not None and cur[0] == sig:
+        return cur[1]
+    idx = BM25Index(items)
+    _indexes.put(namespace, (sig, idx))
+    return idx
+
+
+def get_namespace_index(namespace: str) -> Optional[BM25Index]:
+    cur = _indexes.get(namespace)
+    return cur[1] if cur else None
+
+
+def rrf_fuse(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> Dict[str, float]:
+    """Reciprocal-rank fusion: sum of 1 / (k + rank) over every list an id appears in."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, vid in enumerate(ranking, start=1):
+            fused[vid] = fused.get(vid, 0.0) + 1.0 / (k + rank)
+    return fused
@@ -0,0 +1,207 @@
+# technology lexicon + compiled token-trie matcher (aliases -> canonical names)
+
+import re
+from typing import Dict, FrozenSet, Iterable, List, Sequence, Tuple
+
+# canonical name -> aliases (lowercase). Canonical names match themselves. Every phrase is
+# matched as whole words, so no phrase may be an everyday word or short abbreviation
+# ("node", "spring", "lambda", "tf"): it would flag ordinary prose as a technology.
+TECH_LEXICON: Dict[str, Sequence[str]] = {
+    "python": (),
+    "java": (),
+    "javascript": ("js", "ecmascript"),
+    "typescript": (),
+    "golang": ("go lang",),
+    "rust": (),
+    "c++": ("cpp",),
+    "c#": ("csharp", "c sharp"),
+    "kotlin": (),
+    "scala": (),
+    "ruby": (),
+    "php": (),
+    "sql": (),
+    "nosql": (),
+    "postgresql": ("postgres", "psql"),
+    "mysql": (),
+    "sqlite": (),
+    "mongodb": ("mongo",),
+    "redis": (),
+    "elasticsearch": ("elastic search",),
+    "elk stack": ("elk", "elastic stack"),
+    "cassandra": (),
+    "dynamodb": ("dynamo db",),
+    "snowflake": (),
+    "bigquery": ("big query",),
+    "kafka": ("apache kafka",),
+    "kinesis": (),
+    "rabbitmq": ("rabbit mq",),
+    "airflow": ("apache airflow",),
+    "spark": ("apache spark", "pyspark"),
+    "hadoop": (),
+    "dbt": (),
+    "docker": (),
+    "kubernetes": ("k8s",),
+    "helm": (),
+    "terraform": (),
+    "ansible": (),
+    "aws": ("amazon web services",),
+    "gcp": ("google cloud", "google cloud platform"),
+    "azure": ("microsoft azure",),
+    "aws lambda": (),
+    "s3": ("aws s3",),
+    "graphql": (),
+    "rest api": ("restful", "rest apis", "restful api", "restful apis"),
+    "grpc": (),
+    "react": ("react.js", "reactjs"),
+    "angular": ("angularjs",),
+    "vue": ("vue.js", "vuejs"),
+    "node.js": ("nodejs",),
+    "django": (),
+    "flask": (),
+    "fastapi": (),
+    "spring boot": ("spring framework",),
+    ".net": ("dotnet",),
+    "pytorch": ("torch",),
+    "tensorflow": (),
+    "keras": (),
+    "scikit-learn": ("sklearn", "scikit learn"),
+    "pandas": (),
+    "numpy": (),
+    "ci/cd": ("cicd", "ci cd"),
+    "jenkins": (),
+    "github actions": (),
+    "gitlab": ("gitlab ci",),
+    "git": (),
+    "linux": (),
+    "tableau": (),
+    "power bi": ("powerbi",),
+    "pinecone": (),
+    "faiss": (),
+    "openai": (),
+}
+
+# one-word entries that are also everyday words ("react to incidents", "at the helm"):
+# in running text they only count when capitalized
+PROSE_WORDS = frozenset({"react", "helm", "spark", "rust", "flask", "snowflake", "angular", "ruby", "torch", "airflow"})
+
+_TOKEN_RE = re.compile(r"[a-z0-9.#+/]+", re.IGNORECASE)
+_SENTENCE_END = ".!?:;"
+_END = "\0"
+
+
+def _spans(text: str) -> List[Tuple[str, int]]:
+    # (token, offset) with case kept; "c++", "node.js", "ci/cd" stay intact and
+    # sentence punctuation around tokens is dropped
+    out = []
+    for m in _TOKEN_RE.finditer(text):
+        t = m.group().rstrip("./")
+        stripped = t.lstrip("/")
+        if stripped:
+            out.append((stripped, m.start() + len(t) - len(stripped)))
+    return out
+
+
+def _tokens(text: str) -> List[str]:
+    return [t.lower() for t, _ in _spans(text)]
+
+
+def _base(word: str) -> str:
+    # "APIs" vs "API": compare words without a plural s
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def _term_shaped(token: str) -> bool:
+    # Datadog, gRPC, S3, EC2, C++, F#: what a product or tool name looks like in prose
+    return any(c.isupper() for c in token) or (token[0].isalpha() and any(c.isdigit() for c in token)) or token[-1] in "+#"
+
+
+class TechMatcher:
+    """
+    Word-level trie over every alias. A scan tries the longest phrase at each token,
+    so a batch of texts is matched in one linear pass each, with no regex backtracking.
+    """
+
+    def __init__(self, lexicon: Dict[str, Sequence[str]] = TECH_LEXICON, prose_words: FrozenSet[str] = PROSE_WORDS):
+        self.alias_to_canonical: Dict[str, str] = {}
+        self.prose_words = prose_words
+        self._trie: Dict[str, dict] = {}
+        for canonical, aliases in lexicon.items():
+            for phrase in (canonical,) + tuple(aliases):
+                key = " ".join(_tokens(phrase))
+                if not key:
+                    continue
+                self.alias_to_canonical[key] = canonical
+                node = self._trie
+                for tok in key.split(" "):
+                    node = node.setdefault(tok, {})
+                node[_END] = canonical
+
+    def _scan(self, spans: List[Tuple[str, int]], loose: bool = False) -> List[Tuple[str, int, int]]:
+        """(canonical, first token, end token) of every match, longest phrase first."""
+        toks = [t.lower() for t, _ in spans]
+        out = []
+        i = 0
+        while i < len(toks):
+            node = self._trie
+            match, match_len = None, 0
+            j = i
+            while j < len(toks) and toks[j] in node:
+                node = node[toks[j]]
+                j += 1
+                if _END in node:
+                    match, match_len = node[_END], j - i
+            if not loose and match is not None and match_len == 1 and toks[i] in self.prose_words and spans[i][0].islower():
+                match = None
+            if match is not None:
+                out.append((match, i, i + match_len))
+                i += match_len
+            else:
+                i += 1
+        return out
+
+    def extract(self, text: str, loose: bool = False) -> List[str]:
+        """
+        Canonical technology names found in text, in order of first appearance.
+        `loose` also counts lowercase PROSE_WORDS, for text known to be about
+        technology (the original a rewrite is checked against).
+        """
+        return list(dict.fromkeys(c for c, _, _ in self._scan(_spans(text), loose)))
+
+    def unlisted_terms(self, text: str) -> FrozenSet[str]:
+        """
+        Capitalized or tech-shaped words outside every lexicon match (Datadog, gRPC),
+        lowercased, skipping sentence-initial words. Lets a caller catch tools the
+        lexicon does not list.
+        """
+        spans = _spans(text)
+        covered = set()
+        for _, i, j in self._scan(spans):
+            covered.update(range(i, j))
+        out = set()
+        for k, (tok, off) in enumerate(spans):
+            if k in covered or not _term_shaped(tok):
+                continue
+            before = text[:off].rstrip()
+            if not any(c.isalnum() for c in before) or before[-1] in _SENTENCE_END:
+                continue
+            out.add(_base(tok.lower()))
+        return frozenset(out)
+
+    def words(self, texts: Iterable[str]) -> FrozenSet[str]:
+        """Every word of texts, normalized as unlisted_terms reports them."""
+        return frozenset(_base(t) for text in texts for t in _tokens(text))
+
+    def extract_many(self, texts: Iterable[str], loose: bool = False) -> List[List[str]]:
+        return [self.extract(t, loose) for t in texts]
+
+    def canonicalize(self, name: str) -> str:
+        """Canonical name for a skill string; unknown skills are just normalized."""
+        key = " ".join(_tokens(name))
+        return self.alias_to_canonical.get(key, key)
+
+    def skill_set(self, skills: Iterable[str]) -> FrozenSet[str]:
+        """Canonical set of candidate skills, built once and reused for every bullet."""
+        return frozenset(self.canonicalize(s) for s in skills if s and s.strip())
+
+
+default_matcher = TechMatcher()
@@ -0,0 +1,203 @@
+# in-process vector store (NumPy cosine search) for single-node runs and load tests
+
+import os
+import json
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from .store import Vector, VectorBackend
+from .manifest import manifest
+
+LOCAL_STORE_DIR = os.getenv("LOCAL_STORE_DIR", ".cache/ai_layer/vectors")
+
+
+def _match_value(value: Any, cond: Any) -> bool:
+    if not isinstance(cond, dict):
+        return value == cond
+    for op, arg in cond.items():
+        if op == "$eq" and not value == arg:
+            return False
+        if op == "$ne" and not value != arg:
+            return False
+        if op == "$in" and value not in arg:
+            return False
+        if op == "$nin" and value in arg:
+            return False
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            if op == "$gt" and not value > arg:
+                return False
+            if op == "$gte" and not value >= arg:
+                return False
+            if op == "$lt" and not value < arg:
+                return False
+            if op == "$lte" and not value <= arg:
+                return False
+    return True
+
+
+def matches_filter(metadata: Dict[str, Any], flt: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate the subset of Pinecone's metadata filter language we rely on."""
+    if not flt:
+        return True
+    for key, cond in flt.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, f) for f in cond):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, f) for f in cond):
+                return False
+        elif not _match_value(metadata.get(key), cond):
+            return False
+    return True
+
+
+class _Namespace:
+    """Row-aligned ids / unit-normalized float32 vectors / metadata."""
+
+    def __init__(self, dim: int = 0):
+        self.ids: List[str] = []
+        self.pos: Dict[str, int] = {}
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.metadata: List[Dict[str, Any]] = []
+
+    def upsert(self, vectors: List[Vector]) -> None:
+        if not vectors:
+            return
+        mat = np.asarray([v for _, v, _ in vectors], dtype=np.float32)
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        mat = mat / np.where(norms == 0, 1.0, norms)
+        if self.vectors.shape[0] == 0:
+            self.vectors = np.zeros((0, mat.shape[1]), dtype=np.float32)
+        stored = self.vectors.shape[0]
+        new_rows = []
+        for (vid, _, md), row in zip(vectors, mat):
+            i = self.pos.get(vid)
+            if i is None:
+                # ids grows with new_rows, so its length is the next row's position
+                self.pos[vid] = len(self.ids)
+                new_rows.append(row)
+                self.ids.append(vid)
+                self.metadata.append(dict(md))
+            elif i >= stored:
+                # repeated within this call: the row is still pending
+                new_rows[i - stored] = row
+                self.metadata[i] = dict(md)
+            else:
+                self.vectors[i] = row
+                self.metadata[i] = dict(md)
+        if new_rows:
+            self.vectors = np.vstack([self.vectors, np.asarray(new_rows, dtype=np.float32)])
+
+    def delete(self, ids: List[str]) -> None:
+        drop = {self.pos[i] for i in ids if i in self.pos}
+        if not drop:
+            return
+        keep = [i for i in range(len(self.ids)) if i not in drop]
+        self.ids = [self.ids[i] for i in keep]
+        self.metadata = [self.metadata[i] for i in keep]
+        self.vectors = self.vectors[keep]
+        self.pos = {vid: i for i, vid in enumerate(self.ids)}
+
+
+class LocalBackend(VectorBackend):
+    """
+    Vector backend kept in process memory, one matrix per namespace.
+    Namespaces are persisted to `root` (npz + json) after every write and
+    loaded lazily, so a restart keeps the data.
+    """
+
+    def __init__(self, root: Optional[str] = LOCAL_STORE_DIR):
+        self.root = os.path.abspath(root) if root else None
+        self._lock = threading.RLock()
+        self._spaces: Dict[str, _Namespace] = {}
+        # an in-memory store starts empty in every process, so it never matches a saved manifest
+        self._identity = f"local:{self.root}" if self.root else f"local:memory:{uuid.uuid4().hex}"
+        if self.root:
+            if not os.path.isdir(self.root):
+                # a new (or wiped) store directory holds nothing the manifest may remember
+                manifest.reset_store(self._identity)
+            os.makedirs(self.root, exist_ok=True)
+
+    @property
+    def identity(self) -> str:
+        return self._identity
+
+    def _paths(self, namespace: str) -> Tuple[str, str]:
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in namespace)
+        base = os.path.join(self.root, safe)
+        return base + ".npz", base + ".json"
+
+    def _space(self, namespace: str) -> _Namespace:
+        ns = self._spaces.get(namespace)
+        if ns is None:
+            ns = _Namespace()
+            if self.root:
+                vec_path, md_path = self._paths(namespace)
+                if os.path.exists(vec_path) and os.path.exists(md_path):
+                    ns.vectors = np.load(vec_path)["vectors"]
+                    with open(md_path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    ns.ids = data["ids"]
+                    ns.metadata = data["metadata"]
+                    ns.pos = {vid: i for i, vid in enumerate(ns.ids)}
+            self._spaces[namespace] = ns
+        return ns
+
+    def _persist(self, namespace: str, ns: _Namespace) -> None:
+        if not self.root:
+            return
+        vec_path, md_path = self._paths(namespace)
+        # write-then-rename so a crash never leaves a half-written namespace
+        # (np.savez appends .npz to names that lack it, so keep that suffix last)
+        tmp_vec = vec_path[: -len(".npz")] + ".tmp.npz"
+        np.savez(tmp_vec, vectors=ns.vectors)
+        with open(md_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": ns.ids, "metadata": ns.metadata}, f)
+        os.replace(tmp_vec, vec_path)
+        os.replace(md_path + ".tmp", md_path)
+
+    def upsert(self, namespace: str, vectors: List[Vector]) -> None:
+        with self._lock:
+            ns = self._space(namespace)
+            ns.upsert(vectors)
+            self._persist(namespace, ns)
+
+    def delete(self, namespace: str, ids: List[str]) -> None:
+        with self._lock:
+            ns = self._space(namespace)
+            ns.delete(ids)
+            self._persist(namespace, ns)
+
+    def query(
+        self,
+        namespace: str,
+        vector: List[float],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        include_values: bool = False,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            ns = self._space(namespace)
+            if not ns.ids:
+                return {"matches": [], "namespace": namespace}
+            q = np.asarray(vector, dtype=np.float32)
+            qn = np.linalg.norm(q)
+            scores = ns.vectors @ (q / qn if qn else q)
+            if metadata_filter:
+                mask = np.fromiter((matches_filter(md, metadata_filter) for md in ns.metadata), dtype=bool, count=len(ns.ids))
+                scores = np.where(mask, scores, -np.inf)
+            k = min(top_k, len(ns.ids))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            matches = []
+            for i in top:
+                if not np.isfinite(scores[i]):
+                    continue
+                m = {"id": ns.ids[i], "score": float(scores[i]), "metadata": dict(ns.metadata[i])}
+                if include_values:
+                    m["values"] = ns.vectors[i].tolist()
+                matches.append(m)
+            return {"matches": matches, "namespace": namespace}
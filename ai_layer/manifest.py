@@ -0,0 +1,101 @@
+# per-namespace manifest of what is already in the vector store (id -> content fingerprint)
+
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .cache import default_disk_path
+
+
+def item_fingerprint(text: str, metadata: Dict[str, Any], model: str) -> str:
+    """Changes whenever the stored vector or its metadata would change."""
+    payload = json.dumps([model, text.strip(), metadata], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """
+    SQLite-backed map of (store, namespace) -> {vector id: fingerprint}. `store` is
+    the backend's identity (VectorBackend.identity), so pointing the pipeline at
+    another index or store directory starts from an empty manifest.
+    Without a path it lives in memory only (lost on restart, which just means
+    the next ingest re-upserts everything once). The database is opened on first use.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # callers hold self._lock
+        if self._db is None:
+            d = os.path.dirname(self.path) if self.path else ""
+            if d:
+                os.makedirs(d, exist_ok=True)
+            conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False, isolation_level=None)
+            cols = [r[1] for r in conn.execute("PRAGMA table_info(manifest)").fetchall()]
+            if cols and "store" not in cols:
+                # rows written before manifests were scoped by store: which store they
+                # describe is unknown, so drop them (the next ingest re-upserts once)
+                conn.execute("DROP TABLE manifest")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifest (store TEXT NOT NULL, namespace TEXT NOT NULL, id TEXT NOT NULL, "
+                "fingerprint TEXT NOT NULL, PRIMARY KEY (store, namespace, id))"
+            )
+            self._db = conn
+        return self._db
+
+    def load(self, namespace: str, store: str = "") -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, fingerprint FROM manifest WHERE store=? AND namespace=?", (store, namespace)
+            ).fetchall()
+        return dict(rows)
+
+    def apply(self, namespace: str, upserted: Iterable[Tuple[str, str]], deleted: Iterable[str], store: str = "") -> None:
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO manifest (store, namespace, id, fingerprint) VALUES (?, ?, ?, ?)",
+                    [(store, namespace, vid, fp) for vid, fp in upserted],
+                )
+                conn.executemany(
+                    "DELETE FROM manifest WHERE store=? AND namespace=? AND id=?",
+                    [(store, namespace, vid) for vid in deleted],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def reset(self, namespace: str, store: str = "") -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM manifest WHERE store=? AND namespace=?", (store, namespace))
+
+    def reset_store(self, store: str) -> None:
+        """Forget every namespace of a store (its index was created, wiped or replaced)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM manifest WHERE store=?", (store,))
+
+
+def plan_ingest(
+    current: Dict[str, str], items: List[Tuple[str, str, Dict[str, Any]]], model: str, force: bool = False
+) -> Tuple[List[Tuple[str, str, Dict[str, Any]]], List[str], Dict[str, str]]:
+    """
+    Diff desired items against the manifest.
+    Returns (items to upsert, orphaned ids to delete, fingerprints of the items to upsert).
+    With force, every item is upserted regardless of the manifest.
+    """
+    desired = {vid: item_fingerprint(text, md, model) for vid, text, md in items}
+    changed = [it for it in items if force or current.get(it[0]) != desired[it[0]]]
+    orphans = [vid for vid in current if vid not in desired]
+    return changed, orphans, {vid: desired[vid] for vid, _, _ in changed}
+
+
+manifest = Manifest(default_disk_path("manifest.sqlite"))
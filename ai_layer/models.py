@@ -1,7 +1,7 @@
 # Pydantic schemas
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 class Experience(BaseModel):
     id: str
@@ -33,6 +33,7 @@ class LayerInput(BaseModel):
     user_id: str
     full_profile: FullProfile
     job_description: JobDescription
+    max_rewrites: Optional[int] = None  # cap on LLM rewrites for this request
 
 class TailoredProfile(BaseModel):
     experiences: List[Experience]
@@ -42,4 +43,5 @@ class TailoredProfile(BaseModel):
 
 class LayerOutput(BaseModel):
     user_id: str
-    tailored_profile: TailoredProfile
\ No newline at end of file
+    tailored_profile: TailoredProfile
+    report: Optional[Dict[str, Any]] = None  # stage timings, call/token counts, cost (see tracing.py)
\ No newline at end of file
@@ -1,23 +1,54 @@
 # Orchestration: run(job_desc, full_profile) -> tailored_profile
 
-from typing import Dict, List, Any
-from .models import LayerInput, LayerOutput, TailoredProfile, Experience, Project
-from .store import upsert_bullets, query_topk
-from .rank import keyword_overlap_score, recency_score, combine_scores
-from .rewrite import rewrite_bullet
-from .embeddings import embed_texts, bullet_fingerprint
-from .utils import semantic_similarity_of_texts
+import os
+import asyncio
+import numpy as np
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from .models import LayerInput, LayerOutput, TailoredProfile, Experience, Project, FullProfile, JobDescription
+from .store import get_backend, upsert_bullets, upsert_bullets_async, query_topk, query_topk_async, delete_vectors, delete_vectors_async
+from .manifest import manifest, plan_ingest
+from .lexical import BM25Index, index_namespace, get_namespace_index, keyword_term_sets, rrf_fuse
+from .rank import (
+    keyword_overlap_scores,
+    recency_scores,
+    recency_year,
+    combine_score_columns,
+    top_k_indices,
+    RankWeights,
+    DEFAULT_WEIGHTS,
+    RANK_PROFILES,
+)
+from .rewrite import RewriteJob, rewrite_bullets_bulk_async
+from .embeddings import embed_texts, embed_texts_async, bullet_fingerprint, jd_fingerprint, EMBED_MODEL
+from .utils import similarity_matrix, escape_latex
+from .tracing import Trace, activate, count, emit
+from .dag import Stage, run_stages
+from .aio import run_sync
+from . import jd_cache
 from pydantic import parse_obj_as
 
 # Tunable params
-TOP_K_RETRIEVAL = 60
+# vector candidates; lexical hits are fused in, so this can stay small without losing recall
+TOP_K_RETRIEVAL = 40
+LEXICAL_TOP_K = 40
 SELECT_TOP_N = 20
 FINAL_BULLETS_PER_EXPERIENCE = 6
+# tailor_profile_batch: JDs at least this similar share rewrites (same bullet + mode)
+JD_CLUSTER_THRESHOLD = float(os.getenv("JD_CLUSTER_THRESHOLD", "0.97"))
+# max in-flight network calls per pipeline run (embeddings, Pinecone, chat)
+PIPELINE_CONCURRENCY = int(os.getenv("PIPELINE_CONCURRENCY", "8"))
+# "single": one LLM call per bullet; "batch": one call per experience/project
+REWRITE_STRATEGY = os.getenv("REWRITE_STRATEGY", "single")
+# bullets at or above both thresholds are kept verbatim (intensity "none", no LLM call)
+NOOP_SIM_THRESHOLD = float(os.getenv("NOOP_SIM_THRESHOLD", "0.88"))
+NOOP_KW_THRESHOLD = float(os.getenv("NOOP_KW_THRESHOLD", "0.55"))
+# default per-request cap on LLM rewrites; LayerInput.max_rewrites overrides it
+MAX_LLM_REWRITES = int(os.getenv("MAX_LLM_REWRITES", "40"))
 
 
-def ingest_profile_to_store(user_id: str, profile: Dict[str, Any]) -> None:
+def _profile_items(profile: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
     """
-    Convert full profile into (id, text, metadata) tuples and upsert to Pinecone.
+    Convert full profile into (id, text, metadata) tuples.
     """
     items = []
     # experiences
@@ -33,6 +64,9 @@ def ingest_profile_to_store(user_id: str, profile: Dict[str, Any]) -> None:
                 "start_date": exp.get("start_date"),
                 "end_date": exp.get("end_date"),
             }
+            year = recency_year(md)
+            if year is not None:
+                md["recency_year"] = year
             items.append((vid, b, md))
     # projects
     for proj in profile.get("projects", []):
@@ -45,34 +79,222 @@ def ingest_profile_to_store(user_id: str, profile: Dict[str, Any]) -> None:
     for s in profile.get("skills", []):
         vid = f"skill::{s}"
         items.append((vid, s, {"type": "skill"}))
+    return items
 
-    if items:
-        upsert_bullets(user_id, items)
+
+def ingest_profile_to_store(user_id: str, profile: Dict[str, Any], force: bool = False) -> Tuple[int, int]:
+    """
+    Convert full profile into (id, text, metadata) tuples and sync them to Pinecone.
+    Only new or changed items are embedded and upserted, and ids that are no longer
+    in the profile are deleted, using the per-namespace manifest. The namespace's
+    BM25 index is (re)built alongside. `force` ignores the
+    manifest (e.g. after the index was wiped). Returns (upserted, deleted) counts.
+    """
+    _, changed, orphans, fps = _plan_profile_ingest(user_id, profile, force)
+    if changed:
+        upsert_bullets(user_id, changed)
+    if orphans:
+        delete_vectors(user_id, orphans)
+    manifest.apply(user_id, fps.items(), orphans, store=get_backend().identity)
+    return len(changed), len(orphans)
+
+
+async def ingest_profile_to_store_async(user_id: str, profile: Dict[str, Any], force: bool = False) -> Tuple[int, int]:
+    _, changed, orphans, fps = _plan_profile_ingest(user_id, profile, force)
+    await _apply_ingest_async(user_id, changed, orphans, fps)
+    return len(changed), len(orphans)
+
+
+def _plan_profile_ingest(user_id: str, profile: Dict[str, Any], force: bool = False) -> Tuple[List, List, List, Dict]:
+    """(re)index the namespace lexically and diff the profile against the manifest: (items, changed, orphans, fps)."""
+    items = _profile_items(profile)
+    # one-word skill items would top every BM25 ranking (short documents score highest)
+    # and crowd bullets out of the fused top N, so only bullets are indexed lexically
+    index_namespace(user_id, [it for it in items if it[2].get("type") != "skill"])
+    changed, orphans, fps = plan_ingest(manifest.load(user_id, get_backend().identity), items, EMBED_MODEL, force=force)
+    return items, changed, orphans, fps
+
+
+async def _apply_ingest_async(user_id: str, changed: List, orphans: List[str], fps: Dict[str, str]) -> None:
+    await asyncio.gather(upsert_bullets_async(user_id, changed), delete_vectors_async(user_id, orphans))
+    manifest.apply(user_id, fps.items(), orphans, store=get_backend().identity)
 
 
-def retrieve_and_rank(user_id: str, jd_text: str, jd_keywords: List[str], top_k: int = TOP_K_RETRIEVAL):
+async def _local_matches(items: List[Tuple[str, str, Dict[str, Any]]], jd_vec: List[float], top_k: int) -> Dict[str, Any]:
     """
-    Query Pinecone and return ranked list of matches (with metadata and score)
+    Vector-store-shaped top_k matches computed in process over the profile's own
+    items. Their vectors come from the embedding cache (filled by the ingest plan),
+    so this needs no round trip and no wait for the upsert to become visible.
+    """
+    if not items:
+        return {"matches": []}
+    vecs = await embed_texts_async([t for _, t, _ in items])
+    return _matches_from_scores(items, vecs, similarity_matrix(jd_vec, vecs)[0], top_k)
+
+
+def _matches_from_scores(
+    items: List[Tuple[str, str, Dict[str, Any]]], vecs: List[List[float]], scores: np.ndarray, top_k: int
+) -> Dict[str, Any]:
+    matches = []
+    for i in top_k_indices(scores, top_k):
+        vid, text, md = items[i]
+        md2 = dict(md)
+        md2["_text"] = md2.get("_text") or text
+        matches.append({"id": vid, "score": float(scores[i]), "metadata": md2, "values": vecs[i]})
+    return {"matches": matches}
+
+
+def _gather_candidates(
+    res: Any, jd_keywords: List[str], lexical: Optional[BM25Index] = None, lexical_top_k: int = LEXICAL_TOP_K
+) -> Dict[str, Any]:
+    """
+    Merge vector matches with BM25 hits from the namespace's lexical index into one
+    candidate set, held as column arrays (vector sim, keyword score, recency) so it
+    can be ranked under any weights without re-scoring. Keyword scores are term-coverage
+    lookups in the lexical index; without one (nothing ingested in this process)
+    fuzzy matching is the fallback.
     """
-    res = query_topk(user_id, jd_text, top_k=top_k)
     matches = res.get("matches", []) if isinstance(res, dict) else getattr(res, "matches", [])
-    ranked = []
+    entries: Dict[str, Dict[str, Any]] = {}
     for m in matches:
         md = m.get("metadata", {}) if isinstance(m, dict) else getattr(m, "metadata", {})
-        # obtain vector score if available
-        vector_sim = m.get("score", 0.0) if isinstance(m, dict) else getattr(m, "score", 0.0)
-        kw = keyword_overlap_score(md.get("title", "") + " " + md.get("company", "") + " " + (md.get("_text", "") if md else ""), jd_keywords)
-        rec = recency_score(md)
-        combined = combine_scores(vector_sim, kw, rec)
-        ranked.append({"id": m.get("id") if isinstance(m, dict) else getattr(m, "id"), "metadata": md, "score": combined, "raw": m})
-    ranked.sort(key=lambda x: x["score"], reverse=True)
+        vid = m.get("id") if isinstance(m, dict) else getattr(m, "id")
+        entries[vid] = {
+            "id": vid,
+            "metadata": md or {},
+            # obtain vector score if available
+            "vector_sim": m.get("score", 0.0) if isinstance(m, dict) else getattr(m, "score", 0.0),
+            # stored vector, when the query asked for values (empty list otherwise)
+            "values": (m.get("values") if isinstance(m, dict) else getattr(m, "values", None)) or None,
+            "raw": m,
+        }
+
+    lexical_ranking: List[str] = []
+    if lexical is not None:
+        kw_sets = keyword_term_sets(jd_keywords)
+        query_terms = [t for ks in kw_sets for t in ks]
+        for vid, _ in lexical.search(query_terms, lexical_top_k):
+            lexical_ranking.append(vid)
+            if vid not in entries:
+                # lexical-only hit: no vector score, metadata from the index
+                md = lexical.metadata[lexical.pos[vid]]
+                entries[vid] = {"id": vid, "metadata": md, "vector_sim": 0.0, "values": None, "raw": None}
+        kws = np.fromiter((lexical.coverage(vid, kw_sets) for vid in entries), dtype=np.float32, count=len(entries))
+    else:
+        context = [
+            (e["metadata"].get("title") or "") + " " + (e["metadata"].get("company") or "") + " " + e["metadata"].get("_text", "")
+            for e in entries.values()
+        ]
+        kws = keyword_overlap_scores(context, jd_keywords)
+
+    rows = list(entries.values())
+    # recency_year is precomputed at ingest; recency_year() only parses dates for older vectors
+    years = np.array([recency_year(e["metadata"]) or np.nan for e in rows], dtype=np.float32)
+    return {
+        "entries": rows,
+        "vector_sim": np.array([e["vector_sim"] for e in rows], dtype=np.float32),
+        "kw": np.asarray(kws, dtype=np.float32),
+        "recency": recency_scores(years),
+        "lexical_ranking": lexical_ranking,
+    }
+
+
+def rank_candidates(
+    candidates: Dict[str, Any], weights: RankWeights = DEFAULT_WEIGHTS, limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Score a candidate set with `weights`, fuse the weighted ranking with the lexical
+    ranking by reciprocal-rank fusion, and return the best `limit` entries (all by default).
+    """
+    rows = candidates["entries"]
+    if not rows:
+        return []
+    scores = combine_score_columns(candidates["vector_sim"], candidates["kw"], candidates["recency"], weights)
+    weighted_ranking = [rows[i]["id"] for i in top_k_indices(scores)]
+    fused_map = rrf_fuse([weighted_ranking, candidates["lexical_ranking"]])
+    fused = np.array([fused_map.get(e["id"], 0.0) for e in rows], dtype=np.float64)
+    # the weighted score only breaks ties: it is < 1e-6 while adjacent RRF ranks differ by > 1e-5
+    order = top_k_indices(fused + scores.astype(np.float64) * 1e-6, limit)
+    ranked = []
+    for i in order:
+        e = dict(rows[i])
+        e["score"] = float(scores[i])
+        e["rrf"] = float(fused[i])
+        ranked.append(e)
     return ranked
 
 
+def retrieve_candidates(
+    user_id: str,
+    jd_text: str,
+    jd_keywords: List[str],
+    top_k: int = TOP_K_RETRIEVAL,
+    jd_vector: Optional[List[float]] = None,
+) -> Dict[str, Any]:
+    """Hybrid retrieval (vector store top_k + the user's BM25 index) as an unranked candidate set."""
+    res = query_topk(user_id, jd_text, top_k=top_k, query_vector=jd_vector, include_values=True)
+    return _gather_candidates(res, jd_keywords, get_namespace_index(user_id))
+
+
+async def retrieve_candidates_async(
+    user_id: str,
+    jd_text: str,
+    jd_keywords: List[str],
+    top_k: int = TOP_K_RETRIEVAL,
+    jd_vector: Optional[List[float]] = None,
+) -> Dict[str, Any]:
+    res = await query_topk_async(user_id, jd_text, top_k=top_k, query_vector=jd_vector, include_values=True)
+    return _gather_candidates(res, jd_keywords, get_namespace_index(user_id))
+
+
+def retrieve_and_rank(
+    user_id: str,
+    jd_text: str,
+    jd_keywords: List[str],
+    top_k: int = TOP_K_RETRIEVAL,
+    jd_vector: Optional[List[float]] = None,
+    weights: RankWeights = DEFAULT_WEIGHTS,
+):
+    """
+    Hybrid retrieval: vector store top_k fused with the user's BM25 index, returned
+    as a ranked list of matches (with metadata and score).
+    jd_vector skips re-embedding the JD when the caller already has it.
+    """
+    return rank_candidates(retrieve_candidates(user_id, jd_text, jd_keywords, top_k, jd_vector), weights)
+
+
+async def retrieve_and_rank_async(
+    user_id: str,
+    jd_text: str,
+    jd_keywords: List[str],
+    top_k: int = TOP_K_RETRIEVAL,
+    jd_vector: Optional[List[float]] = None,
+    weights: RankWeights = DEFAULT_WEIGHTS,
+):
+    candidates = await retrieve_candidates_async(user_id, jd_text, jd_keywords, top_k, jd_vector)
+    return rank_candidates(candidates, weights)
+
+
+def retrieve_and_rank_profiles(
+    user_id: str,
+    jd_text: str,
+    jd_keywords: List[str],
+    profiles: Dict[str, RankWeights] = RANK_PROFILES,
+    top_k: int = TOP_K_RETRIEVAL,
+    limit: Optional[int] = SELECT_TOP_N,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Retrieve once and rank the same candidate set under several weight profiles."""
+    candidates = retrieve_candidates(user_id, jd_text, jd_keywords, top_k)
+    return {name: rank_candidates(candidates, w, limit) for name, w in profiles.items()}
+
+
 def decide_intensity(sim_score: float, kw_overlap: float) -> str:
     """
     Decide rewrite intensity for a bullet using thresholds.
+    "none" means the bullet is already well aligned and is not sent to the LLM.
     """
+    if sim_score >= NOOP_SIM_THRESHOLD and kw_overlap >= NOOP_KW_THRESHOLD:
+        return "none"
     if sim_score >= 0.82 and kw_overlap >= 0.45:
         return "light"
     if sim_score >= 0.68 or kw_overlap >= 0.30:
@@ -80,118 +302,170 @@ def decide_intensity(sim_score: float, kw_overlap: float) -> str:
     return "heavy"
 
 
-def tailor_profile(payload: LayerInput) -> LayerOutput:
+async def _plan_rewrites(
+    top_matches: List[Dict[str, Any]],
+    jd_vec: List[float],
+    jd_keywords: List[str],
+    budget: int,
+    sem: asyncio.Semaphore,
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
     """
-    Full pipeline function to call from your backend.
+    Score the top matches against the JD, decide each one's rewrite intensity and
+    spend the rewrite budget in rank order. Returns (sim_map, planned mode by vector id).
     """
-    user_id = payload.user_id
-    profile = payload.full_profile.model_dump()  # dict
-    jd_text = payload.job_description.description
-
-    # 1) ingest into Pinecone (idempotent upserts)
-    ingest_profile_to_store(user_id, profile)
+    # We'll also collect similarity scores per id for later ordering inside experience
+    sim_map: Dict[str, Dict[str, Any]] = {}
 
-    # 2) simple jd keywords
-    import re
-    jd_keywords = [w.strip() for w in re.split(r"[,\\n]", jd_text) if len(w.strip()) > 2][:50]
+    # sim between JD and each text: use the vectors the store returned and only
+    # embed texts whose stored vector is missing (one batched call)
+    texts_for_sim = [(r["metadata"] or {}).get("_text") or (r["metadata"] or {}).get("text") or "" for r in top_matches]
+    try:
+        missing = [i for i, r in enumerate(top_matches) if not r.get("values")]
+        fetched: Dict[int, List[float]] = {}
+        if missing:
+            async with sem:
+                vecs = await embed_texts_async([texts_for_sim[i] for i in missing])
+            fetched = dict(zip(missing, vecs))
+        cand = [r.get("values") or fetched[i] for i, r in enumerate(top_matches)]
+        sims = similarity_matrix(jd_vec, cand)[0].tolist() if cand else []
+    except Exception:
+        sims = [r["score"] for r in top_matches]
 
-    # 3) retrieve and rank
-    ranked = retrieve_and_rank(user_id, jd_text, jd_keywords, top_k=TOP_K_RETRIEVAL)
+    # fuzzy keyword coverage of the bare bullet texts, one texts x keywords matrix
+    kws = keyword_overlap_scores(texts_for_sim, jd_keywords).tolist() if top_matches else []
+    for r, sim, kw in zip(top_matches, sims, kws):
+        sim_map[r["id"]] = {"sim": sim, "kw": kw, "intensity": decide_intensity(sim, kw)}
 
-    # pick top N matches to consider heavy rewrite
-    top_matches = ranked[:SELECT_TOP_N]
+    # spend the rewrite budget in rank order; everything else (bullets outside the
+    # top N, already-aligned bullets, over-budget bullets) keeps its original text
+    planned: Dict[str, str] = {}
+    for r in top_matches:
+        bid = r["id"]
+        if len(planned) >= budget:
+            break
+        if not bid.startswith(("exp::", "proj::")):
+            continue
+        intensity = sim_map[bid]["intensity"]
+        if intensity != "none":
+            planned[bid] = intensity
+    return sim_map, planned
 
-    # map which bullets selected for heavy/medium/light rewrite
-    heavy_set = set()
-    medium_set = set()
-    light_set = set()
 
-    # We'll also collect similarity scores per id for later ordering inside experience
-    sim_map = {}
+async def _rewrite_sections(
+    profile: Dict[str, Any],
+    llm_jobs: List[Tuple],
+    rewrite: Callable[[List[Tuple]], Awaitable[None]],
+    rewritten_by_pos: Dict[Tuple[str, int, int], str],
+    sim_map: Dict[str, Dict[str, Any]],
+    on_section: Callable[[Dict[str, Any]], None],
+) -> None:
+    """
+    Rewrite each experience/project as its own bulk call, all concurrently, and
+    report every section the moment its bullets are done. Sections that need no
+    LLM call are reported first.
+    """
+    by_section: Dict[Tuple[str, int], List[Tuple]] = {}
+    for j in llm_jobs:
+        by_section.setdefault((j[0], j[1]), []).append(j)
 
-    # For vector similarity we can use semantic_similarity_of_texts as fallback if we don't have raw vectors
-    for r in top_matches:
-        raw = r["raw"]
-        bid = r["id"]
-        md = r["metadata"] or {}
-        # compute a rough sim between JD and text (embedding)
-        text_for_sim = md.get("_text") or md.get("text") or ""
-        try:
-            sim = semantic_similarity_of_texts(jd_text, text_for_sim)
-        except Exception:
-            sim = r["score"]
-        kw = keyword_overlap_score(text_for_sim, jd_keywords)
-        intensity = decide_intensity(sim, kw)
-        sim_map[bid] = {"sim": sim, "kw": kw, "intensity": intensity}
-        if intensity == "heavy":
-            heavy_set.add(bid)
-        elif intensity == "medium":
-            medium_set.add(bid)
+    def _report(section: str, sidx: int) -> None:
+        if section == "exp":
+            data = _experience_out(profile["experiences"][sidx], sidx, rewritten_by_pos, sim_map)
+            on_section({"event": "experience", "index": sidx, "data": data})
         else:
-            light_set.add(bid)
+            data = _project_out(profile["projects"][sidx], sidx, rewritten_by_pos)
+            on_section({"event": "project", "index": sidx, "data": data})
 
-    # 4) rewrite bullets (heavy for selected ones; light for others)
-    # We'll rewrite per experience and project bullets
-    rewritten_exps: List[Dict[str, Any]] = []
-    for exp in profile.get("experiences", []):
-        new_bullets = []
-        for idx, b in enumerate(exp.get("bullets", [])):
+    sections = [("exp", i) for i in range(len(profile.get("experiences", [])))]
+    sections += [("proj", i) for i in range(len(profile.get("projects", [])))]
+    for key in sections:
+        if key not in by_section:
+            _report(*key)
+
+    async def _one(key: Tuple[str, int]) -> None:
+        await rewrite(by_section[key])
+        _report(*key)
+
+    await asyncio.gather(*(_one(k) for k in by_section))
+
+
+def _experience_out(
+    exp: Dict[str, Any], sidx: int, rewritten_by_pos: Dict[Tuple[str, int, int], str], sim_map: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    new_bullets = [rewritten_by_pos[("exp", sidx, idx)] for idx in range(len(exp.get("bullets", [])))]
+    # optionally trim bullets for final CV
+    if len(new_bullets) > FINAL_BULLETS_PER_EXPERIENCE:
+        # pick top bullets by sim if available in sim_map, else keep first N;
+        # ties broken by original position so the result is deterministic
+        scored = []
+        for idx in range(len(new_bullets)):
             vid = f"exp::{exp.get('id')}::{idx}"
-            mode = "light"
-            if vid in heavy_set:
-                mode = "heavy"
-            elif vid in medium_set:
-                mode = "medium"
-            # candidate skills: experience skills + profile skills
-            candidate_skills = list(set(exp.get("skills", []) + profile.get("skills", [])))
-            rewritten = rewrite_bullet(b, jd_text, candidate_skills, mode=mode)
-            new_bullets.append(rewritten)
-        # optionally trim bullets for final CV
-        if len(new_bullets) > FINAL_BULLETS_PER_EXPERIENCE:
-            # pick top bullets by sim if available in sim_map, else keep first N
-            scored = []
-            for idx, text in enumerate(exp.get("bullets", [])):
-                vid = f"exp::{exp.get('id')}::{idx}"
-                score = sim_map.get(vid, {}).get("sim", 0.0)
-                scored.append((score, new_bullets[idx]))
-            scored.sort(key=lambda x: x[0], reverse=True)
-            kept = [s for _, s in scored[:FINAL_BULLETS_PER_EXPERIENCE]]
-        else:
-            kept = new_bullets
-        rewritten_exps.append(
-            {
-                "id": exp.get("id"),
-                "title": exp.get("title"),
-                "company": exp.get("company"),
-                "start_date": exp.get("start_date"),
-                "end_date": exp.get("end_date"),
-                "bullets": kept,
-                "skills": exp.get("skills", []),
-            }
-        )
+            score = sim_map.get(vid, {}).get("sim", 0.0)
+            scored.append((-score, idx, new_bullets[idx]))
+        scored.sort(key=lambda x: (x[0], x[1]))
+        kept = [s for _, _, s in scored[:FINAL_BULLETS_PER_EXPERIENCE]]
+    else:
+        kept = new_bullets
+    return {
+        "id": exp.get("id"),
+        "title": exp.get("title"),
+        "company": exp.get("company"),
+        "start_date": exp.get("start_date"),
+        "end_date": exp.get("end_date"),
+        "bullets": kept,
+        "skills": exp.get("skills", []),
+    }
 
-    # 5) rewrite projects
-    rewritten_projects: List[Dict[str, Any]] = []
-    for proj in profile.get("projects", []):
-        new_bullets = []
+
+def _project_out(proj: Dict[str, Any], sidx: int, rewritten_by_pos: Dict[Tuple[str, int, int], str]) -> Dict[str, Any]:
+    new_bullets = [rewritten_by_pos[("proj", sidx, idx)] for idx in range(len(proj.get("bullets", [])))]
+    return {
+        "id": proj.get("id"),
+        "name": proj.get("name"),
+        "bullets": new_bullets,
+        "skills": proj.get("skills", []),
+    }
+
+
+def _profile_jobs(profile: Dict[str, Any], planned: Dict[str, str]) -> List[Tuple]:
+    """One (section, section_idx, bullet_idx, vector id, text, candidate_skills, mode) per bullet."""
+    jobs = []
+    for sidx, exp in enumerate(profile.get("experiences", [])):
+        # candidate skills: experience skills + profile skills
+        candidate_skills = list(set(exp.get("skills", []) + profile.get("skills", [])))
+        for idx, b in enumerate(exp.get("bullets", [])):
+            vid = f"exp::{exp.get('id')}::{idx}"
+            jobs.append(("exp", sidx, idx, vid, b, candidate_skills, planned.get(vid, "none")))
+    for sidx, proj in enumerate(profile.get("projects", [])):
+        candidate_skills = list(set(proj.get("skills", []) + profile.get("skills", [])))
         for idx, b in enumerate(proj.get("bullets", [])):
             vid = f"proj::{proj.get('id')}::{idx}"
-            mode = "light"
-            if vid in heavy_set:
-                mode = "heavy"
-            elif vid in medium_set:
-                mode = "medium"
-            candidate_skills = list(set(proj.get("skills", []) + profile.get("skills", [])))
-            rewritten = rewrite_bullet(b, jd_text, candidate_skills, mode=mode)
-            new_bullets.append(rewritten)
-        rewritten_projects.append(
-            {
-                "id": proj.get("id"),
-                "name": proj.get("name"),
-                "bullets": new_bullets,
-                "skills": proj.get("skills", []),
-            }
-        )
+            jobs.append(("proj", sidx, idx, vid, b, candidate_skills, planned.get(vid, "none")))
+    return jobs
+
+
+def _split_jobs(jobs: List[Tuple], top_matches: List[Dict[str, Any]]) -> Tuple[Dict[Tuple[str, int, int], str], List[Tuple]]:
+    """(final text of no-op bullets by position, LLM jobs in rank order)."""
+    # fast path: no-op bullets never reach the LLM
+    rewritten_by_pos = {(j[0], j[1], j[2]): escape_latex(j[4]) for j in jobs if j[6] == "none"}
+    llm_jobs = [j for j in jobs if j[6] != "none"]
+    # best-ranked bullets are submitted first, so their rewrites start (and the
+    # shared limiter admits them) before lower-ranked ones
+    rank_pos = {r["id"]: i for i, r in enumerate(top_matches)}
+    llm_jobs.sort(key=lambda j: rank_pos.get(j[3], len(rank_pos)))
+    return rewritten_by_pos, llm_jobs
+
+
+def _assemble(
+    user_id: str,
+    profile: Dict[str, Any],
+    rewritten_by_pos: Dict[Tuple[str, int, int], str],
+    sim_map: Dict[str, Dict[str, Any]],
+) -> LayerOutput:
+    rewritten_exps = [
+        _experience_out(exp, sidx, rewritten_by_pos, sim_map) for sidx, exp in enumerate(profile.get("experiences", []))
+    ]
+    rewritten_projects = [_project_out(proj, sidx, rewritten_by_pos) for sidx, proj in enumerate(profile.get("projects", []))]
 
     # 6) assemble final tailored profile
     tailored = {
@@ -203,4 +477,400 @@ def tailor_profile(payload: LayerInput) -> LayerOutput:
 
     # Validate with Pydantic
     tp = TailoredProfile(**tailored)
-    return LayerOutput(user_id=user_id, tailored_profile=tp)
\ No newline at end of file
+    return LayerOutput(user_id=user_id, tailored_profile=tp)
+
+
+async def _rewrite_profile(
+    profile: Dict[str, Any],
+    jd_text: str,
+    planned: Dict[str, str],
+    top_matches: List[Dict[str, Any]],
+    sim_map: Dict[str, Dict[str, Any]],
+    candidates: Dict[str, Any],
+    strategy: str,
+    sem: asyncio.Semaphore,
+    on_section: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[Tuple[str, int, int], str]:
+    """Rewrite every experience/project bullet by its planned mode; returns text by (section, index, bullet)."""
+    # 4+5) rewrite experience and project bullets: all candidates are generated
+    # concurrently (bounded by the run's semaphore, RPM/TPM by the shared chat
+    # limiter), then validated together with one embedding request. Streamed
+    # sections are separate bulk calls, so they share `sem` rather than each
+    # getting its own limit.
+    rewritten_by_pos, llm_jobs = _split_jobs(_profile_jobs(profile, planned), top_matches)
+
+    # vectors the store already returned stand in for re-embedding the originals
+    stored_vectors = {e["id"]: e.get("values") for e in candidates["entries"]}
+
+    async def _rewrite(section_jobs: List[Tuple]) -> None:
+        outs = await rewrite_bullets_bulk_async(
+            [RewriteJob(j[4], j[5], j[6], f"{j[0]}::{j[1]}") for j in section_jobs],
+            jd_text,
+            strategy=strategy,
+            original_vectors=[stored_vectors.get(j[3]) for j in section_jobs],
+            sem=sem,
+        )
+        rewritten_by_pos.update({(j[0], j[1], j[2]): out for j, out in zip(section_jobs, outs)})
+
+    if on_section is None:
+        await _rewrite(llm_jobs)
+    else:
+        await _rewrite_sections(profile, llm_jobs, _rewrite, rewritten_by_pos, sim_map, on_section)
+    return rewritten_by_pos
+
+
+async def tailor_profile_async(
+    payload: LayerInput,
+    concurrency: int = PIPELINE_CONCURRENCY,
+    strategy: str = REWRITE_STRATEGY,
+    weights: RankWeights = DEFAULT_WEIGHTS,
+    on_section: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> LayerOutput:
+    """
+    Full pipeline, asyncio edition. `concurrency` bounds in-flight network calls;
+    `strategy` selects per-bullet ("single") or per-section ("batch") rewriting;
+    `weights` is the ranking policy used to pick the top-N bullets.
+    Every run is traced: the output's `report` holds per-stage timings, upstream
+    call/token/retry counts and estimated cost, and the trace goes to the sinks.
+    With `on_section`, sections are rewritten independently and each tailored
+    experience/project is passed to it as an event as soon as it is done (see
+    tailor_profile_stream_async).
+    """
+    trace = Trace("tailor_profile", user_id=payload.user_id, strategy=strategy)
+    with activate(trace):
+        out = await _tailor_profile(payload, concurrency, strategy, weights, on_section)
+    out.report = trace.report()
+    emit(trace)
+    return out
+
+
+async def _tailor_profile(
+    payload: LayerInput,
+    concurrency: int,
+    strategy: str,
+    weights: RankWeights,
+    on_section: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> LayerOutput:
+    user_id = payload.user_id
+    profile = payload.full_profile.model_dump()  # dict
+    jd_text = payload.job_description.description
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    # The run is a small stage graph (see dag.py): the profile diff/embedding and
+    # the JD keywords/embedding have no dependency on each other, and writing the
+    # changed vectors to the store is off the critical path: when the profile
+    # changed, retrieval ranks the profile's own (freshly embedded) items in process.
+    #
+    #   ingest.plan --> ingest.upsert ------------------------------------.
+    #        \                                                             |
+    #   jd_keywords --> retrieve --> rank --> intensity --> rewrite --> (done)
+    #   jd_embed ---/
+    async def _ingest_plan():
+        items, changed, orphans, fps = _plan_profile_ingest(user_id, profile)
+        # embed the changed items now; the upsert and local retrieval both read the cache
+        await embed_texts_async([t for _, t, _ in changed])
+        count("profile_changed", len(changed))
+        count("profile_orphans", len(orphans))
+        return items, changed, orphans, fps
+
+    async def _ingest_upsert(plan):
+        _, changed, orphans, fps = plan
+        await _apply_ingest_async(user_id, changed, orphans, fps)
+
+    async def _keywords():
+        # simple jd keywords, cached per normalized JD text like the embedding
+        # (in a thread: a miss is computed and the cache's disk tier is SQLite)
+        return await asyncio.to_thread(jd_cache.jd_keywords, jd_text)
+
+    async def _jd_embed():
+        # the JD is embedded once and reused for retrieval and scoring
+        return await jd_cache.jd_embedding_async(jd_text)
+
+    async def _retrieve(plan, jd_keywords, jd_vec):
+        items, changed, orphans, _ = plan
+        if changed or orphans:
+            res = await _local_matches(items, jd_vec, TOP_K_RETRIEVAL)
+            return _gather_candidates(res, jd_keywords, get_namespace_index(user_id))
+        return await retrieve_candidates_async(user_id, jd_text, jd_keywords, TOP_K_RETRIEVAL, jd_vec)
+
+    async def _rank(candidates):
+        # pick top N matches to consider heavy rewrite
+        return rank_candidates(candidates, weights, limit=SELECT_TOP_N)
+
+    async def _intensity(top_matches, jd_keywords, jd_vec):
+        # rewrite intensity per top match, within the request's rewrite budget
+        budget = MAX_LLM_REWRITES if payload.max_rewrites is None else payload.max_rewrites
+        return await _plan_rewrites(top_matches, jd_vec, jd_keywords, budget, sem)
+
+    async def _rewrite_stage(scored, top_matches, candidates):
+        sim_map, planned = scored
+        return await _rewrite_profile(
+            profile, jd_text, planned, top_matches, sim_map, candidates, strategy, sem, on_section
+        )
+
+    results = await run_stages(
+        [
+            Stage("ingest.plan", _ingest_plan),
+            Stage("jd_keywords", _keywords),
+            Stage("jd_embed", _jd_embed),
+            Stage("ingest.upsert", _ingest_upsert, ("ingest.plan",)),
+            Stage("retrieve", _retrieve, ("ingest.plan", "jd_keywords", "jd_embed")),
+            Stage("rank", _rank, ("retrieve",)),
+            Stage("intensity", _intensity, ("rank", "jd_keywords", "jd_embed")),
+            Stage("rewrite", _rewrite_stage, ("intensity", "rank", "retrieve")),
+        ]
+    )
+    sim_map, _ = results["intensity"]
+    return _assemble(user_id, profile, results["rewrite"], sim_map)
+
+
+def tailor_profile(
+    payload: LayerInput,
+    concurrency: int = PIPELINE_CONCURRENCY,
+    strategy: str = REWRITE_STRATEGY,
+    weights: RankWeights = DEFAULT_WEIGHTS,
+) -> LayerOutput:
+    """
+    Full pipeline function to call from your backend.
+    Thin sync wrapper around tailor_profile_async (run on the shared background
+    loop, see aio.run_sync); from async code await that directly.
+    """
+    return run_sync(tailor_profile_async(payload, concurrency=concurrency, strategy=strategy, weights=weights))
+
+
+async def tailor_profile_stream_async(
+    payload: LayerInput,
+    concurrency: int = PIPELINE_CONCURRENCY,
+    strategy: str = REWRITE_STRATEGY,
+    weights: RankWeights = DEFAULT_WEIGHTS,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming edition of tailor_profile_async. Yields an event per tailored section
+    as soon as its bullets are rewritten and validated, in completion order, then
+    a final summary:
+      {"event": "experience", "index": i, "data": <Experience>}
+      {"event": "project", "index": i, "data": <Project>}
+      {"event": "summary", "data": <LayerOutput, report included>}
+    The pipeline runs in its own task; closing the iterator early cancels it.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def _produce() -> None:
+        try:
+            out = await tailor_profile_async(payload, concurrency, strategy, weights, on_section=queue.put_nowait)
+            queue.put_nowait({"event": "summary", "data": out.model_dump()})
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            queue.put_nowait(done)
+
+    task = asyncio.create_task(_produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+def tailor_profile_stream(
+    payload: LayerInput,
+    concurrency: int = PIPELINE_CONCURRENCY,
+    strategy: str = REWRITE_STRATEGY,
+    weights: RankWeights = DEFAULT_WEIGHTS,
+) -> Iterator[Dict[str, Any]]:
+    """Sync generator over tailor_profile_stream_async's events (driven on the shared background loop)."""
+    agen = tailor_profile_stream_async(payload, concurrency=concurrency, strategy=strategy, weights=weights)
+    end = object()
+
+    async def _next() -> Any:
+        try:
+            return await agen.__anext__()
+        except StopAsyncIteration:
+            return end
+
+    try:
+        while True:
+            item = run_sync(_next())
+            if item is end:
+                break
+            yield item
+    finally:
+        run_sync(agen.aclose())
+
+
+def cluster_jds(jd_texts: List[str], jd_vecs: List[List[float]], threshold: float = JD_CLUSTER_THRESHOLD) -> List[int]:
+    """
+    Representative index for every JD: the first earlier JD with the same normalized
+    text or a cosine similarity of at least `threshold`, else the JD itself.
+    """
+    sims = similarity_matrix(jd_vecs, jd_vecs) if jd_vecs else np.zeros((0, 0))
+    fps = [jd_fingerprint(t) for t in jd_texts]
+    reps: List[int] = []
+    for i in range(len(jd_texts)):
+        rep = i
+        for r in sorted(set(reps)):
+            if fps[r] == fps[i] or sims[i, r] >= threshold:
+                rep = r
+                break
+        reps.append(rep)
+    return reps
+
+
+async def tailor_profile_batch_async(
+    user_id: str,
+    profile: Union[FullProfile, Dict[str, Any]],
+    jds: List[Union[JobDescription, Dict[str, Any], str]],
+    concurrency: int = PIPELINE_CONCURRENCY,
+    strategy: str = REWRITE_STRATEGY,
+    weights: RankWeights = DEFAULT_WEIGHTS,
+    max_rewrites: Optional[int] = None,
+) -> List[LayerOutput]:
+    """
+    Tailor one profile against many job descriptions; one LayerOutput per JD, in order.
+    The profile is ingested once, all JDs are embedded in one call and scored against
+    every profile item as one bullets x JDs similarity matrix. JDs that are (near-)
+    identical form a cluster, and each distinct (bullet, mode) within a cluster is
+    rewritten once, against the cluster's first JD. `max_rewrites` applies per JD.
+    Every output carries the report of the whole batch.
+    """
+    if isinstance(profile, FullProfile):
+        profile = profile.model_dump()
+    else:
+        profile = FullProfile(**profile).model_dump()
+    jd_texts = []
+    for jd in jds:
+        if isinstance(jd, str):
+            jd = JobDescription(description=jd)
+        elif isinstance(jd, dict):
+            jd = JobDescription(**jd)
+        jd_texts.append(jd.description)
+    if not jd_texts:
+        return []
+    budget = MAX_LLM_REWRITES if max_rewrites is None else max_rewrites
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _ingest_plan():
+        items, changed, orphans, fps = _plan_profile_ingest(user_id, profile)
+        await embed_texts_async([t for _, t, _ in changed])
+        count("profile_changed", len(changed))
+        return items, changed, orphans, fps
+
+    async def _ingest_upsert(plan):
+        _, changed, orphans, fps = plan
+        await _apply_ingest_async(user_id, changed, orphans, fps)
+
+    async def _keywords():
+        return await asyncio.to_thread(lambda: [jd_cache.jd_keywords(t) for t in jd_texts])
+
+    async def _jd_embed():
+        # every uncached JD in one embedding request
+        return await jd_cache.jd_embeddings_async(jd_texts)
+
+    async def _score(plan, jd_vecs):
+        # one (JDs x items) similarity matrix; item vectors come from the embedding cache
+        items = plan[0]
+        vecs = await embed_texts_async([t for _, t, _ in items]) if items else []
+        return vecs, similarity_matrix(jd_vecs, vecs) if vecs else np.zeros((len(jd_vecs), 0))
+
+    async def _plan(plan, keywords, jd_vecs, scored):
+        items = plan[0]
+        vecs, matrix = scored
+        lexical = get_namespace_index(user_id)
+        per_jd = []
+        for i in range(len(jd_texts)):
+            candidates = _gather_candidates(_matches_from_scores(items, vecs, matrix[i], TOP_K_RETRIEVAL), keywords[i], lexical)
+            top_matches = rank_candidates(candidates, weights, limit=SELECT_TOP_N)
+            sim_map, planned = await _plan_rewrites(top_matches, jd_vecs[i], keywords[i], budget, sem)
+            per_jd.append((top_matches, sim_map, planned))
+        return per_jd
+
+    async def _rewrite(plan, jd_vecs, scored, per_jd):
+        # profile vectors stand in for re-embedding the originals during validation
+        item_vecs = dict(zip((vid for vid, _, _ in plan[0]), scored[0]))
+        reps = cluster_jds(jd_texts, jd_vecs)
+        count("jd_clusters", len(set(reps)))
+        positions: List[Dict[Tuple[str, int, int], str]] = []
+        # distinct (bullet, skills, mode) per cluster -> positions waiting for its result
+        pending: Dict[int, Dict[Tuple[str, Tuple[str, ...], str], List[Tuple[int, Tuple[str, int, int]]]]] = {}
+        job_for: Dict[Tuple[int, Tuple[str, Tuple[str, ...], str]], Tuple] = {}
+        for i, (top_matches, _, planned) in enumerate(per_jd):
+            done, llm_jobs = _split_jobs(_profile_jobs(profile, planned), top_matches)
+            positions.append(done)
+            for j in llm_jobs:
+                key = (j[4], tuple(j[5]), j[6])
+                pending.setdefault(reps[i], {}).setdefault(key, []).append((i, (j[0], j[1], j[2])))
+                job_for.setdefault((reps[i], key), j)
+        count("rewrite_batch_shared", sum(len(w) - 1 for c in pending.values() for w in c.values()))
+
+        async def _cluster(rep: int, wanted: Dict) -> None:
+            keys = list(wanted)
+            section_jobs = [job_for[(rep, k)] for k in keys]
+            outs = await rewrite_bullets_bulk_async(
+                [RewriteJob(j[4], j[5], j[6], f"{j[0]}::{j[1]}") for j in section_jobs],
+                jd_texts[rep],
+                strategy=strategy,
+                original_vectors=[item_vecs.get(j[3]) for j in section_jobs],
+                sem=sem,
+            )
+            for k, out in zip(keys, outs):
+                for i, pos in wanted[k]:
+                    positions[i][pos] = out
+
+        # clusters run concurrently but draw on the batch's one semaphore
+        await asyncio.gather(*(_cluster(rep, wanted) for rep, wanted in pending.items()))
+        return positions
+
+    trace = Trace("tailor_profile_batch", user_id=user_id, jds=len(jd_texts), strategy=strategy)
+    with activate(trace):
+        results = await run_stages(
+            [
+                Stage("ingest.plan", _ingest_plan),
+                Stage("jd_keywords", _keywords),
+                Stage("jd_embed", _jd_embed),
+                Stage("ingest.upsert", _ingest_upsert, ("ingest.plan",)),
+                Stage("score", _score, ("ingest.plan", "jd_embed")),
+                Stage("plan", _plan, ("ingest.plan", "jd_keywords", "jd_embed", "score")),
+                Stage("rewrite", _rewrite, ("ingest.plan", "jd_embed", "score", "plan")),
+            ]
+        )
+        outputs = [
+            _assemble(user_id, profile, by_pos, sim_map)
+            for by_pos, (_, sim_map, _) in zip(results["rewrite"], results["plan"])
+        ]
+    report = trace.report()
+    for out in outputs:
+        out.report = report
+    emit(trace)
+    return outputs
+
+
+def tailor_profile_batch(
+    user_id: str,
+    profile: Union[FullProfile, Dict[str, Any]],
+    jds: List[Union[JobDescription, Dict[str, Any], str]],
+    concurrency: int = PIPELINE_CONCURRENCY,
+    strategy: str = REWRITE_STRATEGY,
+    weights: RankWeights = DEFAULT_WEIGHTS,
+    max_rewrites: Optional[int] = None,
+) -> List[LayerOutput]:
+    """Sync wrapper around tailor_profile_batch_async (runs on the shared background loop)."""
+    return run_sync(
+        tailor_profile_batch_async(
+            user_id, profile, jds, concurrency=concurrency, strategy=strategy, weights=weights, max_rewrites=max_rewrites
+        )
+    )
+
+
+# entry point used by the API layer
+run = tailor_profile_async
@@ -15,4 +15,12 @@ REWRITE_INSTRUCTION = (
 )
 
 LIGHT_REWRITE_HINT = "Tone: light retouch only (minor wording)."
-HEAVY_REWRITE_HINT = "Tone: strong alignment (emphasize JD-relevant aspects)."
\ No newline at end of file
+HEAVY_REWRITE_HINT = "Tone: strong alignment (emphasize JD-relevant aspects)."
+BATCH_REWRITE_INSTRUCTION = (
+    "Job Description (JD):\n{jd}\n\n"
+    "Candidate Skills: {skills}\n\n"
+    "Original Bullets (numbered, each with its rewrite tone):\n{bullets}\n\n"
+    "Task: Rewrite every bullet so it aligns with the JD terminology and priorities while staying 100% faithful to its own original facts. "
+    "Do not merge, split, reorder or drop bullets. If a bullet is already optimal, return it unchanged. "
+    "Respond with a JSON object of the form {{\"bullets\": [\"...\", ...]}} containing exactly {count} strings, in the same order."
+)
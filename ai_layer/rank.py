@@ -1,35 +1,109 @@
 # scoring (vector sim + keyword overlap + recency)
 
-from typing import List, Dict
-from rapidfuzz import fuzz
+import os
+from typing import List, Dict, NamedTuple, Optional
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# cdist worker threads; -1 uses every core
+KEYWORD_WORKERS = int(os.getenv("KEYWORD_WORKERS", "-1"))
 
 # Basic, fast keyword coverage using fuzzy matching
 
+def keyword_overlap_matrix(texts: List[str], jd_keywords: List[str], workers: int = KEYWORD_WORKERS) -> np.ndarray:
+    """
+    Fuzzy partial-ratio of every text against every keyword, in [0, 1]: shape (texts, keywords).
+    One rapidfuzz cdist call (C++, multi-threaded) instead of a Python loop per pair.
+    """
+    if not texts or not jd_keywords:
+        return np.zeros((len(texts), len(jd_keywords)), dtype=np.float32)
+    m = process.cdist(
+        [t.lower() for t in texts],
+        [k.lower() for k in jd_keywords],
+        scorer=fuzz.partial_ratio,
+        dtype=np.float32,
+        workers=workers,
+    )
+    return m / 100.0
+
+
+def keyword_overlap_scores(texts: List[str], jd_keywords: List[str]) -> np.ndarray:
+    """Mean keyword coverage per text: shape (texts,)."""
+    if not jd_keywords:
+        return np.zeros(len(texts), dtype=np.float32)
+    return keyword_overlap_matrix(texts, jd_keywords).mean(axis=1)
+
+
 def keyword_overlap_score(text: str, jd_keywords: List[str]) -> float:
     if not jd_keywords: return 0.0
-    scores = []
-    low = text.lower()
-    for kw in jd_keywords:
-        s = fuzz.partial_ratio(low, kw.lower()) / 100.0
-        scores.append(s)
-    return sum(scores) / max(1, len(scores))
+    return float(keyword_overlap_scores([text], jd_keywords)[0])
 
 
-def recency_score(meta: Dict) -> float:
-    # crude: favor newer experiences
-    year = None
+class RankWeights(NamedTuple):
+    vector: float = 0.6
+    keyword: float = 0.25
+    recency: float = 0.15
+
+
+DEFAULT_WEIGHTS = RankWeights()
+
+# named ranking policies, cheap to compare on one candidate set (see pipeline.retrieve_and_rank_profiles)
+RANK_PROFILES: Dict[str, RankWeights] = {
+    "default": DEFAULT_WEIGHTS,
+    "semantic": RankWeights(0.75, 0.15, 0.10),
+    "keyword": RankWeights(0.45, 0.45, 0.10),
+    "recent": RankWeights(0.5, 0.2, 0.3),
+}
+
+
+def recency_year(meta: Dict) -> Optional[int]:
+    """Year of end_date, else start_date (YYYY-...); None when neither parses."""
+    year = meta.get("recency_year")
+    if isinstance(year, (int, float)):
+        return int(year)
     for k in ("end_date", "start_date"):
         v = meta.get(k)
         if v and len(v) >= 4:
             try:
-                year = int(v[:4])
-                break
+                return int(v[:4])
             except Exception:
                 pass
+    return None
+
+
+def recency_scores(years: np.ndarray) -> np.ndarray:
+    """Vectorized recency: NaN (unknown) -> 0.3, ~2000 -> 0.3 .. 2030 -> 1.0."""
+    years = np.asarray(years, dtype=np.float32)
+    out = np.clip((years - 2000) / 30.0, 0.3, 1.0)
+    return np.where(np.isnan(years), np.float32(0.3), out)
+
+
+def recency_score(meta: Dict) -> float:
+    # crude: favor newer experiences
+    year = recency_year(meta)
     if not year:
         return 0.3
     return min(1.0, max(0.3, (year - 2000) / 30.0))  # ~2000→0.0 .. 2030→1.0
 
 
-def combine_scores(vector_sim: float, kw_score: float, recency: float) -> float:
-    return 0.6 * vector_sim + 0.25 * kw_score + 0.15 * recency
\ No newline at end of file
+def combine_scores(vector_sim: float, kw_score: float, recency: float, weights: RankWeights = DEFAULT_WEIGHTS) -> float:
+    return weights.vector * vector_sim + weights.keyword * kw_score + weights.recency * recency
+
+
+def combine_score_columns(
+    vector_sim: np.ndarray, kw: np.ndarray, recency: np.ndarray, weights: RankWeights = DEFAULT_WEIGHTS
+) -> np.ndarray:
+    """Column-wise combine_scores over a whole candidate set."""
+    return weights.vector * vector_sim + weights.keyword * kw + weights.recency * recency
+
+
+def top_k_indices(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """Indices of the k best scores, best first (argpartition, then sort only the k)."""
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
@@ -0,0 +1,82 @@
+# requests-per-minute / tokens-per-minute budgets shared by all callers in the process
+
+import os
+import time
+import asyncio
+import threading
+from typing import Optional
+
+CHAT_RPM = int(os.getenv("CHAT_RPM", "500"))
+CHAT_TPM = int(os.getenv("CHAT_TPM", "200000"))
+EMBED_RPM = int(os.getenv("EMBED_RPM", "3000"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))
+
+
+class RateLimiter:
+    """
+    Two token buckets (requests and tokens) refilled continuously over a minute.
+    Guarded by a threading lock so one instance can be shared by threads and by
+    any number of event loops; waiting is done outside the lock.
+    A limit of 0 disables that bucket.
+    """
+
+    def __init__(self, rpm: int, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._req = float(rpm)
+        self._tok = float(tpm)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._req = min(self.rpm, self._req + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tok = min(self.tpm, self._tok + elapsed * self.tpm / 60.0)
+
+    def _try_take(self, tokens: int) -> float:
+        """Take budget if available and return 0, otherwise return seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            # a single oversized request may use the whole bucket but never waits forever
+            need_tok = min(tokens, self.tpm) if self.tpm else 0
+            wait = 0.0
+            if self.rpm and self._req < 1:
+                wait = max(wait, (1 - self._req) * 60.0 / self.rpm)
+            if self.tpm and self._tok < need_tok:
+                wait = max(wait, (need_tok - self._tok) * 60.0 / self.tpm)
+            if wait == 0.0:
+                if self.rpm:
+                    self._req -= 1
+                if self.tpm:
+                    self._tok -= need_tok
+            return wait
+
+    def configure(self, rpm: Optional[int] = None, tpm: Optional[int] = None) -> None:
+        """Change limits in place so modules holding a reference see the new budget."""
+        with self._lock:
+            if rpm is not None:
+                self.rpm, self._req = rpm, float(rpm)
+            if tpm is not None:
+                self.tpm, self._tok = tpm, float(tpm)
+
+    async def acquire(self, tokens: int = 0) -> None:
+        while True:
+            wait = self._try_take(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self, tokens: int = 0) -> None:
+        while True:
+            wait = self._try_take(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+chat_limiter = RateLimiter(CHAT_RPM, CHAT_TPM)
+embed_limiter = RateLimiter(EMBED_RPM, EMBED_TPM)
+
@@ -1,61 +1,255 @@
 # GPT-4o-mini rewriting + validators
 
+import os
 import re
-from typing import List
+import json
+import asyncio
+import hashlib
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
 from tenacity import retry, wait_exponential_jitter, stop_after_attempt
-from openai import OpenAI
-from .prompts import SYSTEM_REWRITE, REWRITE_INSTRUCTION, LIGHT_REWRITE_HINT, HEAVY_REWRITE_HINT
-from .utils import extract_technologies, semantic_similarity_of_texts, escape_latex
+from openai import OpenAI, AsyncOpenAI
+from .prompts import SYSTEM_REWRITE, REWRITE_INSTRUCTION, BATCH_REWRITE_INSTRUCTION, LIGHT_REWRITE_HINT, HEAVY_REWRITE_HINT
+from .aio import LoopLocal, run_sync
+from .ratelimit import chat_limiter
+from .tracing import count, note_retry, record_usage, span, usage_tokens
+from .cache import TieredCache, default_disk_path
+from .embeddings import estimate_tokens, embed_texts_async, bullet_fingerprint, jd_fingerprint
+from .lexicon import default_matcher
+from .dedup import group_near_duplicates
+from .utils import extract_technologies, semantic_similarity_of_texts, escape_latex, paired_similarity
 
 # instantiate client (OpenAI auto-reads OPENAI_API_KEY env var if using openai.OpenAI)
 client = OpenAI()
+# one async client per event loop (see aio.LoopLocal)
+aclients: LoopLocal[AsyncOpenAI] = LoopLocal(AsyncOpenAI)
 
 # adjust minimum semantic similarity you require between original and rewritten
 SEMANTIC_THRESHOLD = 0.78
 
+REWRITE_MODEL = "gpt-4o-mini"
+REWRITE_TEMPERATURE = 0.18
+REWRITE_MAX_TOKENS = 160
+# completion ceiling for one batched call (per-bullet budget x bullets, capped)
+BATCH_MAX_TOKENS = 4096
+
+# validated rewrites are memoized; entries expire after REWRITE_CACHE_TTL seconds
+REWRITE_CACHE_TTL = float(os.getenv("REWRITE_CACHE_TTL", str(7 * 24 * 3600)))
+REWRITE_CACHE_MEMORY_ITEMS = int(os.getenv("REWRITE_CACHE_MEMORY_ITEMS", "20000"))
+REWRITE_CACHE_DISK_ITEMS = int(os.getenv("REWRITE_CACHE_DISK_ITEMS", "200000"))
+
+rewrite_cache = TieredCache(
+    "rewrites",
+    encode=lambda v: v.encode("utf-8"),
+    decode=lambda b: b.decode("utf-8"),
+    memory_items=REWRITE_CACHE_MEMORY_ITEMS,
+    disk_items=REWRITE_CACHE_DISK_ITEMS,
+    disk_path=default_disk_path("rewrites.sqlite") if REWRITE_CACHE_DISK_ITEMS > 0 else None,
+    ttl_seconds=REWRITE_CACHE_TTL,
+)
+
+
+def _hint(mode: str) -> str:
+    return HEAVY_REWRITE_HINT if mode == "heavy" else LIGHT_REWRITE_HINT
+
 
 def _build_prompt(original: str, jd: str, skills: List[str], mode: str) -> str:
     base = REWRITE_INSTRUCTION.format(jd=jd, skills=", ".join(skills), bullet=original)
-    hint = HEAVY_REWRITE_HINT if mode == "heavy" else LIGHT_REWRITE_HINT
-    return base + "\n" + hint
+    return base + "\n" + _hint(mode)
+
+
+def _build_batch_prompt(originals: List[str], jd: str, skills: List[str], modes: List[str]) -> str:
+    listed = "\n".join(f'{i + 1}. "{b}" ({_hint(m)})' for i, (b, m) in enumerate(zip(originals, modes)))
+    return BATCH_REWRITE_INSTRUCTION.format(jd=jd, skills=", ".join(skills), bullets=listed, count=len(originals))
+
+
+def _budget_tokens(prompt: str, max_tokens: int = REWRITE_MAX_TOKENS) -> int:
+    # what the call can cost against the TPM budget: prompt + completion ceiling
+    return estimate_tokens(SYSTEM_REWRITE) + estimate_tokens(prompt) + max_tokens
+
+
+def _messages(prompt: str) -> List[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_REWRITE},
+        {"role": "user", "content": prompt},
+    ]
 
 
-@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(4))
+def _record(resp, prompt: str) -> None:
+    content = resp.choices[0].message.content or ""
+    tokens = usage_tokens(resp, estimate_tokens(SYSTEM_REWRITE) + estimate_tokens(prompt), estimate_tokens(content))
+    record_usage("chat", REWRITE_MODEL, *tokens)
+
+
+@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(4), before_sleep=note_retry)
 def _call_llm(prompt: str) -> str:
+    chat_limiter.acquire_blocking(_budget_tokens(prompt))
     # Use the Chat/Completions interface for now with low temperature.
     resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": SYSTEM_REWRITE},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.18,
-        max_tokens=160,
+        model=REWRITE_MODEL,
+        messages=_messages(prompt),
+        temperature=REWRITE_TEMPERATURE,
+        max_tokens=REWRITE_MAX_TOKENS,
     )
+    _record(resp, prompt)
     text = resp.choices[0].message.content.strip()
     return text
 
 
-def _no_new_techs(original: str, rewritten: str, candidate_skills: List[str]) -> bool:
+@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(4), before_sleep=note_retry)
+async def _call_llm_async(prompt: str) -> str:
+    await chat_limiter.acquire(_budget_tokens(prompt))
+    resp = await aclients.get().chat.completions.create(
+        model=REWRITE_MODEL,
+        messages=_messages(prompt),
+        temperature=REWRITE_TEMPERATURE,
+        max_tokens=REWRITE_MAX_TOKENS,
+    )
+    _record(resp, prompt)
+    return resp.choices[0].message.content.strip()
+
+
+def _batch_max_tokens(n: int) -> int:
+    return min(BATCH_MAX_TOKENS, REWRITE_MAX_TOKENS * n + 32)
+
+
+@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(4), before_sleep=note_retry)
+async def _call_llm_json_async(prompt: str, max_tokens: int) -> str:
+    await chat_limiter.acquire(_budget_tokens(prompt, max_tokens))
+    resp = await aclients.get().chat.completions.create(
+        model=REWRITE_MODEL,
+        messages=_messages(prompt),
+        temperature=REWRITE_TEMPERATURE,
+        max_tokens=max_tokens,
+        response_format={"type": "json_object"},
+    )
+    _record(resp, prompt)
+    return resp.choices[0].message.content
+
+
+def _parse_batch(raw: str, n: int) -> List[Optional[str]]:
+    """
+    Extract the rewritten bullets from a batched JSON reply.
+    Entries that are missing or not strings come back as None (-> original).
+    """
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return [None] * n
+    items = data.get("bullets") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return [None] * n
+    out: List[Optional[str]] = []
+    for i in range(n):
+        v = items[i] if i < len(items) else None
+        out.append(_clean(v) if isinstance(v, str) and v.strip() else None)
+    return out
+
+
+def _no_new_techs(
+    original: str,
+    rewritten: str,
+    candidate_skills: List[str],
+    allowed: Optional[FrozenSet[str]] = None,
+    skill_words: Optional[FrozenSet[str]] = None,
+) -> bool:
     """
     Ensure that any detected techs in rewritten are present in original OR candidate_skills.
-    This is a fast conservative check — it relies on regex tech extraction; not perfect,
-    but will catch many hallucinations like adding "Kubernetes" when original didn't mention it.
+    Techs come from the lexicon matcher and are compared by canonical name, so aliases
+    ("k8s" vs "Kubernetes") do not trip the check. Tools the lexicon does not list are
+    caught by shape: a capitalized or tech-shaped word (Datadog, gRPC) the original and
+    the skills never use fails the check too. Pass `allowed` (default_matcher.skill_set)
+    and `skill_words` (default_matcher.words) to reuse them across many bullets.
     """
-    orig_tech = set([t.lower() for t in extract_technologies(original)])
-    new_tech = set([t.lower() for t in extract_technologies(rewritten)])
-    allowed = set([s.lower() for s in candidate_skills] + list(orig_tech))
-    return new_tech.issubset(allowed)
+    if allowed is None:
+        allowed = default_matcher.skill_set(candidate_skills)
+    if skill_words is None:
+        skill_words = default_matcher.words(candidate_skills)
+    orig_tech = set(default_matcher.extract(original, loose=True))
+    if not all(t in allowed or t in orig_tech for t in extract_technologies(rewritten)):
+        return False
+    return default_matcher.unlisted_terms(rewritten) <= default_matcher.words([original]) | skill_words
+
+
+def _clean(out: str) -> str:
+    # small cleanup: single-line, trim weird whitespace
+    return " ".join(out.splitlines()).strip()
+
+
+def _skills_hash(candidate_skills: List[str]) -> str:
+    norm = sorted({s.strip().lower() for s in candidate_skills if s.strip()})
+    return hashlib.sha1("\x1f".join(norm).encode("utf-8")).hexdigest()
+
+
+def rewrite_cache_key(original: str, jd_text: str, candidate_skills: List[str], mode: str) -> str:
+    """Content key for a rewrite: model, bullet, normalized JD, mode and candidate skill set."""
+    return ":".join(
+        (REWRITE_MODEL, bullet_fingerprint(original), jd_fingerprint(jd_text), mode, _skills_hash(candidate_skills))
+    )
+
+
+def _validate(
+    original: str, out_single: str, sim: float, candidate_skills: List[str], tech_ok: Optional[bool] = None
+) -> bool:
+    # semantic threshold: too different from the original -> reject
+    if sim < SEMANTIC_THRESHOLD:
+        return False
+    # no-new-tech check (precomputed by bulk callers)
+    if tech_ok is not None:
+        return tech_ok
+    return _no_new_techs(original, out_single, candidate_skills)
+
+
+def _accept(
+    original: str,
+    out_single: str,
+    sim: float,
+    candidate_skills: List[str],
+    key: Optional[str] = None,
+    tech_ok: Optional[bool] = None,
+) -> str:
+    """
+    Apply validators and return the LaTeX-escaped result (original on failure).
+    Passing results are stored under `key`; fallbacks never are.
+    """
+    if not _validate(original, out_single, sim, candidate_skills, tech_ok):
+        return escape_latex(original)
+
+    # final escape
+    result = escape_latex(out_single)
+    if key is not None:
+        rewrite_cache.put(key, result)
+    return result
+
+
+def _tech_checks(pairs: List[Tuple[str, str]], skill_lists: List[List[str]]) -> List[bool]:
+    """
+    _no_new_techs for many (original, rewrite) pairs, with the canonical skill set and
+    skill words built once per distinct skill list instead of once per bullet.
+    """
+    by_skills: Dict[Tuple[str, ...], Tuple[FrozenSet[str], FrozenSet[str]]] = {}
+    out = []
+    for (original, rewritten), skills in zip(pairs, skill_lists):
+        k = tuple(skills)
+        if k not in by_skills:
+            by_skills[k] = (default_matcher.skill_set(skills), default_matcher.words(skills))
+        out.append(_no_new_techs(original, rewritten, skills, *by_skills[k]))
+    return out
 
 
 def rewrite_bullet(original: str, jd_text: str, candidate_skills: List[str], mode: str = "heavy") -> str:
     """
     Rewrites a single bullet:
+      - Returns the memoized result if this (bullet, JD, mode, skills) was rewritten before
       - Builds a prompt including original and JD
       - Calls LLM
       - Validates: semantic similarity + no-new-techs
       - Returns LaTeX-escaped rewritten bullet or original as fallback
     """
+    key = rewrite_cache_key(original, jd_text, candidate_skills, mode)
+    cached = rewrite_cache.get(key)
+    if cached is not None:
+        return cached
+
     prompt = _build_prompt(original, jd_text, candidate_skills, mode)
     try:
         out = _call_llm(prompt)
@@ -63,8 +257,7 @@ def rewrite_bullet(original: str, jd_text: str, candidate_skills: List[str], mod
         # LLM failed -> return original
         return escape_latex(original)
 
-    # small cleanup: single-line, trim weird whitespace
-    out_single = " ".join(out.splitlines()).strip()
+    out_single = _clean(out)
 
     # semantic check (embedding-based)
     try:
@@ -72,13 +265,188 @@ def rewrite_bullet(original: str, jd_text: str, candidate_skills: List[str], mod
     except Exception:
         sim = 0.0
 
-    if sim < SEMANTIC_THRESHOLD:
-        # fallback to original (too semantically different)
-        return escape_latex(original)
+    return _accept(original, out_single, sim, candidate_skills, key)
 
-    # no-new-tech check
-    if not _no_new_techs(original, out_single, candidate_skills):
-        return escape_latex(original)
 
-    # final escape
-    return escape_latex(out_single)
\ No newline at end of file
+class RewriteJob(NamedTuple):
+    """One bullet to rewrite. `group` ties bullets that share a call in batch strategy."""
+
+    original: str
+    candidate_skills: List[str]
+    mode: str
+    group: Optional[str] = None
+
+
+async def _generate_one(job: RewriteJob, jd_text: str) -> Optional[str]:
+    try:
+        out = await _call_llm_async(_build_prompt(job.original, jd_text, job.candidate_skills, job.mode))
+    except Exception:
+        # LLM failed -> original
+        return None
+    return _clean(out) or None
+
+
+async def _generate_group(jobs: List[RewriteJob], jd_text: str) -> List[Optional[str]]:
+    prompt = _build_batch_prompt([j.original for j in jobs], jd_text, jobs[0].candidate_skills, [j.mode for j in jobs])
+    try:
+        raw = await _call_llm_json_async(prompt, _batch_max_tokens(len(jobs)))
+    except Exception:
+        return [None] * len(jobs)
+    return _parse_batch(raw, len(jobs))
+
+
+async def rewrite_bullets_bulk_async(
+    jobs: List[RewriteJob],
+    jd_text: str,
+    strategy: str = "single",
+    original_vectors: Optional[Sequence[Optional[List[float]]]] = None,
+    concurrency: int = 8,
+    dedupe: bool = True,
+    sem: Optional[asyncio.Semaphore] = None,
+) -> List[str]:
+    """
+    Two-phase rewrite of many bullets against one JD:
+      1) generate: serve memoized results, then produce every remaining candidate
+         (one call per bullet, or one per `group` with strategy="batch")
+      2) validate: embed all originals and rewrites in a single request, score the
+         pairs in one vectorized pass, then apply SEMANTIC_THRESHOLD and _no_new_techs
+    original_vectors (aligned with jobs, None where unknown) lets callers supply
+    vectors already held, e.g. from the vector store; the rest come from the
+    embedding cache or are embedded in the same batch as the rewrites.
+    With dedupe, exact and near-duplicate bullets of the same mode are rewritten once:
+    the first of each group is generated, and its accepted rewrite is copied to each
+    other member that passes both validators against its own original (the members
+    are scored in the same embedding request).
+    `sem` bounds the generation calls and the validation request; pass one semaphore
+    to every call of a run so that concurrent calls share one `concurrency` limit.
+    Without it each call makes its own of size `concurrency`.
+    Returns LaTeX-escaped results in input order.
+    """
+    if not jobs:
+        return []
+    keys = [rewrite_cache_key(j.original, jd_text, j.candidate_skills, j.mode) for j in jobs]
+    found = await rewrite_cache.get_many_async(list(dict.fromkeys(keys)))
+    results: List[Optional[str]] = [found.get(k) for k in keys]
+    todo = [i for i, r in enumerate(results) if r is None]
+    count("rewrite_cache_hits", len(jobs) - len(todo))
+    if not todo:
+        return results  # type: ignore[return-value]
+
+    # phase 0: collapse duplicates; only representatives are generated
+    copies: Dict[int, List[int]] = {}
+    if dedupe and len(todo) > 1:
+        by_mode: Dict[str, List[int]] = {}
+        for i in todo:
+            by_mode.setdefault(jobs[i].mode, []).append(i)
+        for idxs in by_mode.values():
+            vecs = [original_vectors[i] for i in idxs] if original_vectors is not None else None
+            for g in group_near_duplicates([jobs[i].original for i in idxs], vecs):
+                copies[idxs[g[0]]] = [idxs[k] for k in g[1:]]
+        reps = sorted(copies)
+        count("rewrite_dedup_collapsed", len(todo) - len(reps))
+    else:
+        reps = todo
+
+    # phase 1: generation
+    with span("rewrite.generate", strategy=strategy, bullets=len(reps)):
+        if sem is None:
+            sem = asyncio.Semaphore(max(1, concurrency))
+        outs: Dict[int, Optional[str]] = {}
+        if strategy == "batch":
+            groups: Dict[Optional[str], List[int]] = {}
+            for i in reps:
+                groups.setdefault(jobs[i].group, []).append(i)
+
+            async def _run_group(idxs: List[int]) -> None:
+                async with sem:
+                    got = await _generate_group([jobs[i] for i in idxs], jd_text)
+                outs.update(zip(idxs, got))
+
+            await asyncio.gather(*(_run_group(g) for g in groups.values()))
+        else:
+
+            async def _run_one(i: int) -> None:
+                async with sem:
+                    outs[i] = await _generate_one(jobs[i], jd_text)
+
+            await asyncio.gather(*(_run_one(i) for i in reps))
+
+    # phase 2: bulk validation; a duplicate's copy is scored against its own original
+    produced = [i for i in reps if outs.get(i) is not None]
+    members = [(m, r) for r in produced for m in copies.get(r, ())]
+    with span("rewrite.validate", bullets=len(produced) + len(members)):
+        sims: Dict[int, float] = {}
+        if produced:
+            sources = produced + [m for m, _ in members]
+            given = {i: original_vectors[i] for i in sources if original_vectors is not None and original_vectors[i]}
+            need = [i for i in sources if i not in given]
+            try:
+                async with sem:
+                    vecs = await embed_texts_async([jobs[i].original for i in need] + [outs[i] for i in produced])
+                orig_vecs = dict(given)
+                orig_vecs.update(zip(need, vecs[: len(need)]))
+                out_vecs = dict(zip(produced, vecs[len(need) :]))
+                pairs = [(i, i) for i in produced] + members
+                scored = paired_similarity([orig_vecs[i] for i, _ in pairs], [out_vecs[r] for _, r in pairs])
+                sims = {i: float(x) for (i, _), x in zip(pairs, scored)}
+            except Exception:
+                sims = {}
+
+        # one pass over every produced pair and every copy; skill sets built once per distinct skill list
+        checks = _tech_checks(
+            [(jobs[i].original, outs[i]) for i in produced] + [(jobs[m].original, outs[r]) for m, r in members],
+            [jobs[i].candidate_skills for i in produced] + [jobs[m].candidate_skills for m, _ in members],
+        )
+        techs = dict(zip(produced + [m for m, _ in members], checks))
+        for i in reps:
+            if outs.get(i) is None:
+                results[i] = escape_latex(jobs[i].original)
+                for m in copies.get(i, ()):
+                    results[m] = escape_latex(jobs[m].original)
+        # passing results are memoized in one write at the end; fallbacks never are
+        accepted = set()
+        fresh: Dict[str, str] = {}
+        for i in produced:
+            job = jobs[i]
+            if _validate(job.original, outs[i], sims.get(i, 0.0), job.candidate_skills, techs[i]):
+                accepted.add(i)
+                results[i] = fresh[keys[i]] = escape_latex(outs[i])
+            else:
+                count("rewrite_rejected")
+                results[i] = escape_latex(job.original)
+        # a copy goes through the same validators (and cache rule) as the rewrite it copies
+        for m, r in members:
+            job = jobs[m]
+            if r in accepted and _validate(job.original, outs[r], sims.get(m, 0.0), job.candidate_skills, techs[m]):
+                results[m] = fresh[keys[m]] = escape_latex(outs[r])
+            else:
+                results[m] = escape_latex(job.original)
+    if fresh:
+        await rewrite_cache.put_many_async(fresh)
+    return results  # type: ignore[return-value]
+
+
+async def rewrite_bullet_async(original: str, jd_text: str, candidate_skills: List[str], mode: str = "heavy") -> str:
+    """Async twin of rewrite_bullet."""
+    return (await rewrite_bullets_bulk_async([RewriteJob(original, candidate_skills, mode)], jd_text))[0]
+
+
+async def rewrite_bullets_batch_async(
+    originals: List[str], jd_text: str, candidate_skills: List[str], modes: List[str]
+) -> List[str]:
+    """Async twin of rewrite_bullets_batch."""
+    jobs = [RewriteJob(o, candidate_skills, m, "section") for o, m in zip(originals, modes)]
+    return await rewrite_bullets_bulk_async(jobs, jd_text, strategy="batch")
+
+
+def rewrite_bullets_batch(
+    originals: List[str], jd_text: str, candidate_skills: List[str], modes: List[str]
+) -> List[str]:
+    """
+    Rewrites all bullets of one experience/project in a single structured-output call,
+    so the JD is sent once instead of once per bullet. Each returned bullet is
+    validated on its own and falls back to its original independently.
+    Memoized bullets are served from the rewrite cache and left out of the call.
+    Runs rewrite_bullets_batch_async on the shared background loop (see aio.run_sync).
+    """
+    return run_sync(rewrite_bullets_batch_async(originals, jd_text, candidate_skills, modes))
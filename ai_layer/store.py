@@ -1,72 +1,264 @@
-# Pinecone index helpers (create, upsert, query)
+# vector store helpers (upsert, query, delete) over a pluggable backend: Pinecone or in-process
 
 import os
+import asyncio
+import threading
+from abc import ABC, abstractmethod
 from typing import List, Tuple, Dict, Any, Optional
 from tenacity import retry, wait_exponential_jitter, stop_after_attempt
-import pinecone
-from .embeddings import embed_texts
+from .embeddings import embed_texts, embed_texts_async
+from .tracing import count, note_retry
+from .manifest import manifest
+
+# "pinecone" (default) or "local" (in-process NumPy store, see local_store.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
 
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENV = os.getenv("PINECONE_ENVIRONMENT", "us-east1-gcp")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "cv-bullets")
+# connection pool size of each long-lived index handle (also used for parallel upsert batches)
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "4"))
+
+Vector = Tuple[str, List[float], Dict[str, Any]]
+
+
+class VectorBackend(ABC):
+    """Interface every vector store backend implements. Namespaces isolate users."""
+
+    @property
+    @abstractmethod
+    def identity(self) -> str:
+        """Names the physical store (backend + index or directory); the ingest manifest is kept per identity."""
+
+    @abstractmethod
+    def upsert(self, namespace: str, vectors: List[Vector]) -> None:
+        ...
+
+    @abstractmethod
+    def query(
+        self,
+        namespace: str,
+        vector: List[float],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        include_values: bool = False,
+    ) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def delete(self, namespace: str, ids: List[str]) -> None:
+        ...
+
+
+class PineconeBackend(VectorBackend):
+    """
+    Pinecone-backed store. Keeps one pooled, thread-safe index handle per index
+    and checks index existence on the control plane once per process.
+    """
+
+    def __init__(self, index_name: str = PINECONE_INDEX_NAME):
+        # Initialize Pinecone client (idempotent); imported here so the local backend needs no key
+        if PINECONE_API_KEY is None:
+            raise RuntimeError("PINECONE_API_KEY is not set in environment")
+        import pinecone
 
-# Initialize Pinecone client (idempotent)
-if PINECONE_API_KEY is None:
-    raise RuntimeError("PINECONE_API_KEY is not set in environment")
+        pinecone.init(api_key=PINECONE_API_KEY, environment=PINECONE_ENV)
+        self._pc = pinecone
+        self.index_name = index_name
+        self._lock = threading.Lock()
+        self._handle: Any = None
+        self._ready = False
 
-pinecone.init(api_key=PINECONE_API_KEY, environment=PINECONE_ENV)
+    @property
+    def identity(self) -> str:
+        return f"pinecone:{PINECONE_ENV}/{self.index_name}"
 
+    def get_index(self) -> Any:
+        """Return the shared handle for the index, creating it on first use."""
+        if self._handle is None:
+            with self._lock:
+                if self._handle is None:
+                    self._handle = self._pc.Index(self.index_name, pool_threads=PINECONE_POOL_THREADS)
+        return self._handle
 
-def ensure_index(dimension: int, metric: str = "cosine") -> None:
-    """Create index if missing."""
-    if PINECONE_INDEX_NAME not in pinecone.list_indexes():
-        pinecone.create_index(name=PINECONE_INDEX_NAME, dimension=dimension, metric=metric)
+    def ensure_index(self, dimension: int, metric: str = "cosine") -> None:
+        """Create index if missing. The control-plane check runs once per process."""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            if self.index_name not in self._pc.list_indexes():
+                self._pc.create_index(name=self.index_name, dimension=dimension, metric=metric)
+                # a new index is empty whatever the manifest remembers
+                manifest.reset_store(self.identity)
+            self._ready = True
+
+    def reset(self) -> None:
+        """
+        Forget the handle and readiness (e.g. after an index was deleted out of band),
+        and the manifest of this index, so the next ingest re-upserts everything.
+        """
+        with self._lock:
+            self._handle = None
+            self._ready = False
+        manifest.reset_store(self.identity)
+
+    def upsert(self, namespace: str, vectors: List[Vector]) -> None:
+        # ensure index dimension
+        self.ensure_index(len(vectors[0][1]))
+        idx = self.get_index()
+        # upsert in batches of 100; several batches go out in parallel over the handle's pool
+        batch_size = 100
+        if len(vectors) <= batch_size:
+            idx.upsert(vectors=vectors, namespace=namespace)
+            return
+        pending = [
+            idx.upsert(vectors=vectors[i : i + batch_size], namespace=namespace, async_req=True)
+            for i in range(0, len(vectors), batch_size)
+        ]
+        for p in pending:
+            p.get()
+
+    def query(
+        self,
+        namespace: str,
+        vector: List[float],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        include_values: bool = False,
+    ) -> Dict[str, Any]:
+        return self.get_index().query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True,
+            include_values=include_values,
+            namespace=namespace,
+            filter=metadata_filter,
+        )
+
+    def delete(self, namespace: str, ids: List[str]) -> None:
+        idx = self.get_index()
+        batch_size = 1000
+        for i in range(0, len(ids), batch_size):
+            idx.delete(ids=ids[i : i + batch_size], namespace=namespace)
+
+
+_backend_lock = threading.Lock()
+_backend: Optional[VectorBackend] = None
+
+
+def get_backend() -> VectorBackend:
+    """Process-wide backend selected by VECTOR_BACKEND, built on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if VECTOR_BACKEND == "local":
+                    from .local_store import LocalBackend
+
+                    _backend = LocalBackend()
+                elif VECTOR_BACKEND == "pinecone":
+                    _backend = PineconeBackend()
+                else:
+                    raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND!r}")
+    return _backend
+
+
+def set_backend(backend: VectorBackend) -> None:
+    """Install a backend explicitly (custom implementations, load runs)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(5), before_sleep=note_retry)
+def _upsert_vectors(user_id: str, items: List[Tuple[str, str, Dict[str, Any]]], embeddings: List[List[float]]) -> None:
+    vectors = []
+    for (vid, text, md), vec in zip(items, embeddings):
+        # store original text too in metadata for convenience
+        md2 = dict(md)
+        md2["_text"] = md2.get("_text") or text
+        vectors.append((vid, vec, md2))
+    count("vector_calls")
+    count("vector_upserted", len(vectors))
+    get_backend().upsert(user_id, vectors)
 
 
-@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(5))
 def upsert_bullets(user_id: str, items: List[Tuple[str, str, Dict[str, Any]]]) -> None:
     """
-    Upsert items into Pinecone.
+    Upsert items into the vector store.
     items: list of tuples (id, text, metadata)
     We use namespace=user_id for per-user isolation.
     """
     if not items:
         return
 
-    # batch embed
-    texts = [t for (_, t, _) in items]
-    embeddings = embed_texts(texts)
+    # batch embed (embed_texts retries on its own)
+    embeddings = embed_texts([t for (_, t, _) in items])
+    _upsert_vectors(user_id, items, embeddings)
 
-    # ensure index dimension
-    dim = len(embeddings[0])
-    ensure_index(dim)
 
-    idx = pinecone.Index(PINECONE_INDEX_NAME)
-    vectors = []
-    for (vid, _, md), vec in zip(items, embeddings):
-        # store original text too in metadata for convenience
-        md2 = dict(md)
-        md2["_text"] = md2.get("_text") or texts.pop(0)  # if not present, use
-        vectors.append((vid, vec, md2))
-    # upsert in batches of 100
-    batch_size = 100
-    for i in range(0, len(vectors), batch_size):
-        batch = vectors[i : i + batch_size]
-        idx.upsert(vectors=batch, namespace=user_id)
+async def upsert_bullets_async(user_id: str, items: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+    """Async twin of upsert_bullets; backends are sync so the upsert runs in a thread."""
+    if not items:
+        return
+    embeddings = await embed_texts_async([t for (_, t, _) in items])
+    await asyncio.to_thread(_upsert_vectors, user_id, items, embeddings)
+
+
+@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(5), before_sleep=note_retry)
+def _query_vector(
+    user_id: str,
+    qvec: List[float],
+    top_k: int,
+    metadata_filter: Optional[Dict[str, Any]],
+    include_values: bool = False,
+) -> Dict[str, Any]:
+    count("vector_calls")
+    return get_backend().query(user_id, qvec, top_k, metadata_filter, include_values=include_values)
 
 
-@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(5))
 def query_topk(
     user_id: str,
-    query_text: str,
+    query_text: Optional[str] = None,
     top_k: int = 25,
     metadata_filter: Optional[Dict[str, Any]] = None,
+    query_vector: Optional[List[float]] = None,
+    include_values: bool = False,
 ) -> Dict[str, Any]:
     """
-    Query Pinecone for top_k matches given the query_text.
-    Returns the raw Pinecone response dict-like object.
+    Query the vector store for top_k matches given the query_text.
+    Pass query_vector instead when the caller already holds the embedding, and
+    include_values to get the stored vectors back with each match.
+    Returns the raw backend response (dict-like, with "matches").
     """
-    idx = pinecone.Index(PINECONE_INDEX_NAME)
-    qvec = embed_texts([query_text])[0]
-    resp = idx.query(vector=qvec, top_k=top_k, include_metadata=True, namespace=user_id, filter=metadata_filter)
-    return resp
\ No newline at end of file
+    qvec = query_vector if query_vector is not None else embed_texts([query_text])[0]
+    return _query_vector(user_id, qvec, top_k, metadata_filter, include_values)
+
+
+async def query_topk_async(
+    user_id: str,
+    query_text: Optional[str] = None,
+    top_k: int = 25,
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    query_vector: Optional[List[float]] = None,
+    include_values: bool = False,
+) -> Dict[str, Any]:
+    """Async twin of query_topk."""
+    qvec = query_vector if query_vector is not None else (await embed_texts_async([query_text]))[0]
+    return await asyncio.to_thread(_query_vector, user_id, qvec, top_k, metadata_filter, include_values)
+
+
+@retry(wait=wait_exponential_jitter(1, 8), stop=stop_after_attempt(5), before_sleep=note_retry)
+def delete_vectors(user_id: str, ids: List[str]) -> None:
+    """Delete vectors by id from the user's namespace."""
+    if not ids:
+        return
+    count("vector_calls")
+    get_backend().delete(user_id, ids)
+
+
+async def delete_vectors_async(user_id: str, ids: List[str]) -> None:
+    if ids:
+        await asyncio.to_thread(delete_vectors, user_id, ids)
@@ -0,0 +1,237 @@
+# per-request stage timings, call/token counters and cost estimates, emitted to pluggable sinks
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# comma-separated default sinks: "logging", "otel" (needs opentelemetry-api), or empty for none
+TRACE_SINKS = os.getenv("TRACE_SINKS", "logging")
+
+# USD per 1K tokens: (input, output). Override with AI_LAYER_PRICES='{"model": [in, out]}'
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "text-embedding-3-small": (0.00002, 0.0),
+    "text-embedding-3-large": (0.00013, 0.0),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+}
+MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("AI_LAYER_PRICES", "{}")).items()})
+
+logger = logging.getLogger("ai_layer.trace")
+
+
+class Trace:
+    """
+    Spans and counters of one pipeline run. Safe to update from threads and tasks;
+    the active trace travels in a context variable, so asyncio tasks and
+    asyncio.to_thread calls started inside `activate` report into it.
+    """
+
+    def __init__(self, name: str, **attrs: Any):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.start_ns = time.time_ns()
+        self._t0 = time.perf_counter()
+        self.end_ms: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Dict[str, float] = {}
+        self.cost_usd = 0.0
+        self._lock = threading.Lock()
+
+    def now_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000.0
+
+    def add_span(self, name: str, start_ms: float, end_ms: float, attrs: Dict[str, Any]) -> None:
+        span = {"name": name, "start_ms": round(start_ms, 3), "duration_ms": round(end_ms - start_ms, 3)}
+        if attrs:
+            span["attrs"] = attrs
+        with self._lock:
+            self.spans.append(span)
+
+    def incr(self, key: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def add_cost(self, usd: float) -> None:
+        with self._lock:
+            self.cost_usd += usd
+
+    def finish(self) -> None:
+        if self.end_ms is None:
+            self.end_ms = self.now_ms()
+
+    def report(self) -> Dict[str, Any]:
+        """Plain-dict summary (also what LayerOutput.report carries)."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "total_ms": round(self.end_ms if self.end_ms is not None else self.now_ms(), 3),
+                "spans": sorted((dict(s) for s in self.spans), key=lambda s: s["start_ms"]),
+                "counters": dict(self.counters),
+                "cost_usd": round(self.cost_usd, 6),
+            }
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("ai_layer_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def activate(trace: Trace) -> Iterator[Trace]:
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        trace.finish()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a stage of the active trace (no-op without one). The yielded dict can
+    be filled with attributes known only at the end, e.g. item counts.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield attrs
+        return
+    start = trace.now_ms()
+    try:
+        yield attrs
+    finally:
+        trace.add_span(name, start, trace.now_ms(), attrs)
+
+
+def count(key: str, n: float = 1) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.incr(key, n)
+
+
+def record_usage(kind: str, model: str, input_tokens: int, output_tokens: int = 0) -> None:
+    """Count one upstream call of `kind` ("embed" / "chat") with its tokens and estimated cost."""
+    trace = _current.get()
+    if trace is None:
+        return
+    trace.incr(f"{kind}_calls")
+    trace.incr(f"{kind}_input_tokens", input_tokens)
+    if output_tokens:
+        trace.incr(f"{kind}_output_tokens", output_tokens)
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    trace.add_cost(input_tokens / 1000.0 * price_in + output_tokens / 1000.0 * price_out)
+
+
+def note_retry(retry_state: Any) -> None:
+    """tenacity before_sleep hook: counts retries per wrapped function."""
+    fn = getattr(retry_state, "fn", None)
+    count("retries")
+    count(f"retries.{getattr(fn, '__name__', 'call')}")
+
+
+def usage_tokens(resp: Any, fallback_in: int, fallback_out: int = 0) -> Tuple[int, int]:
+    """(input, output) tokens from an OpenAI response's usage, estimates when absent."""
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return fallback_in, fallback_out
+    prompt = getattr(usage, "prompt_tokens", None)
+    if prompt is None:
+        prompt = getattr(usage, "total_tokens", fallback_in)
+    return int(prompt), int(getattr(usage, "completion_tokens", None) or 0)
+
+
+class TraceSink(ABC):
+    """Receives every finished trace."""
+
+    @abstractmethod
+    def emit(self, trace: Trace) -> None:
+        ...
+
+
+class LoggingSink(TraceSink):
+    """One INFO record per run with the JSON report."""
+
+    def __init__(self, log: logging.Logger = logger, level: int = logging.INFO):
+        self.log = log
+        self.level = level
+
+    def emit(self, trace: Trace) -> None:
+        if self.log.isEnabledFor(self.level):
+            self.log.log(self.level, "%s %s", trace.name, json.dumps(trace.report(), default=str))
+
+
+class OpenTelemetrySink(TraceSink):
+    """
+    Replays a finished trace as OpenTelemetry spans: one root span per run with a
+    child per stage, counters as root attributes. Needs opentelemetry-api; spans go
+    wherever the application's TracerProvider exports them.
+    """
+
+    def __init__(self, tracer_name: str = "ai_layer"):
+        from opentelemetry import trace as otel_trace
+
+        self._otel = otel_trace
+        self.tracer = otel_trace.get_tracer(tracer_name)
+
+    def emit(self, trace: Trace) -> None:
+        rep = trace.report()
+        start = trace.start_ns
+        root = self.tracer.start_span(trace.name, start_time=start)
+        for k, v in trace.attrs.items():
+            root.set_attribute(k, v if isinstance(v, (str, int, float, bool)) else str(v))
+        for k, v in rep["counters"].items():
+            root.set_attribute(f"ai_layer.{k}", v)
+        root.set_attribute("ai_layer.cost_usd", rep["cost_usd"])
+        ctx = self._otel.set_span_in_context(root)
+        for s in rep["spans"]:
+            s_start = start + int(s["start_ms"] * 1e6)
+            child = self.tracer.start_span(s["name"], context=ctx, start_time=s_start)
+            for k, v in (s.get("attrs") or {}).items():
+                child.set_attribute(k, v if isinstance(v, (str, int, float, bool)) else str(v))
+            child.end(end_time=s_start + int(s["duration_ms"] * 1e6))
+        root.end(end_time=start + int(rep["total_ms"] * 1e6))
+
+
+def _default_sinks() -> List[TraceSink]:
+    sinks: List[TraceSink] = []
+    for name in (s.strip() for s in TRACE_SINKS.split(",")):
+        if name == "logging":
+            sinks.append(LoggingSink())
+        elif name == "otel":
+            sinks.append(OpenTelemetrySink())
+        elif name:
+            raise ValueError(f"Unknown trace sink: {name!r}")
+    return sinks
+
+
+_sinks_lock = threading.Lock()
+_sinks: List[TraceSink] = _default_sinks()
+
+
+def add_sink(sink: TraceSink) -> None:
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def set_sinks(sinks: List[TraceSink]) -> None:
+    global _sinks
+    with _sinks_lock:
+        _sinks = list(sinks)
+
+
+def emit(trace: Trace) -> None:
+    """Hand a finished trace to every sink; a failing sink never fails the request."""
+    trace.finish()
+    for sink in list(_sinks):
+        try:
+            sink.emit(trace)
+        except Exception:
+            logger.exception("trace sink %r failed", sink)
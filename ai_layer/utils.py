@@ -1,9 +1,9 @@
 # hashing, LaTeX escaping, text cleaning
 
-import re
-import math
-from typing import List
-from .embeddings import embed_texts
+from typing import List, Sequence, Union
+import numpy as np
+from .embeddings import embed_texts, embed_texts_async
+from .lexicon import default_matcher
 
 LATEX_ESC = {
     "\\": r"\textbackslash{}",
@@ -18,11 +18,6 @@ LATEX_ESC = {
     "^": r"\textasciicircum{}",
 }
 
-TECH_REGEX = re.compile(
-    r"\b([A-Z][A-Za-z0-9+.#-]{1,}|aws|gcp|azure|sql|nosql|ci/cd|rest|graphql|kafka|kinesis|airflow|spark|hadoop|docker|kubernetes|postgresql|mysql|redis|mongodb|pytorch|tensorflow)\b",
-    flags=re.IGNORECASE,
-)
-
 
 def escape_latex(text: str) -> str:
     out = []
@@ -32,41 +27,57 @@ def escape_latex(text: str) -> str:
 
 
 def extract_technologies(text: str) -> List[str]:
-    found = TECH_REGEX.findall(text)
-    # normalize tokens
-    normalized = []
-    for f in found:
-        if isinstance(f, tuple):
-            # when regex groups used, f might be tuple — choose first non-empty
-            token = next((s for s in f if s), "")
-        else:
-            token = f
-        token = token.strip()
-        if token:
-            normalized.append(token)
-    # dedupe case-insensitively, preserve original-like formatting
-    seen = set()
-    out = []
-    for t in normalized:
-        key = t.lower()
-        if key not in seen:
-            seen.add(key)
-            out.append(t)
-    return out
+    """Canonical technology names in text (lexicon matcher; aliases such as k8s -> kubernetes)."""
+    return default_matcher.extract(text)
+
+
+VectorLike = Union[Sequence[float], Sequence[Sequence[float]], np.ndarray]
+
+
+def to_unit_matrix(vectors: VectorLike) -> np.ndarray:
+    """Stack vectors into a 2-D float32 array with unit-length rows (zero rows stay zero)."""
+    mat = np.asarray(vectors, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat[None, :]
+    if mat.size == 0:
+        return mat.reshape(mat.shape[0], -1)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return mat / np.where(norms == 0, 1.0, norms)
+
+
+def similarity_matrix(queries: VectorLike, candidates: VectorLike) -> np.ndarray:
+    """
+    Cosine similarity of every query against every candidate: shape (n_queries, n_candidates).
+    A single vector counts as one query. One matrix product replaces n*m Python dot loops.
+    """
+    q = to_unit_matrix(queries)
+    c = to_unit_matrix(candidates)
+    if q.shape[0] == 0 or c.shape[0] == 0:
+        return np.zeros((q.shape[0], c.shape[0]), dtype=np.float32)
+    return q @ c.T
+
+
+def paired_similarity(a: VectorLike, b: VectorLike) -> np.ndarray:
+    """Row-wise cosine similarity of two equally sized stacks: shape (n,)."""
+    ua = to_unit_matrix(a)
+    ub = to_unit_matrix(b)
+    if ua.shape[0] == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.einsum("ij,ij->i", ua, ub)
 
 
 def cosine_similarity(a: List[float], b: List[float]) -> float:
-    if not a or not b:
+    if a is None or b is None or len(a) == 0 or len(b) == 0:
         return 0.0
-    dot = sum(x * y for x, y in zip(a, b))
-    na = math.sqrt(sum(x * x for x in a))
-    nb = math.sqrt(sum(y * y for y in b))
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (na * nb)
+    return float(paired_similarity(a, b)[0])
 
 
 def semantic_similarity_of_texts(text_a: str, text_b: str) -> float:
     """Convenience wrapper: embed two texts and return cosine similarity."""
     a, b = embed_texts([text_a, text_b])
-    return cosine_similarity(a, b)
\ No newline at end of file
+    return cosine_similarity(a, b)
+
+
+async def semantic_similarity_of_texts_async(text_a: str, text_b: str) -> float:
+    a, b = await embed_texts_async([text_a, text_b])
+    return cosine_similarity(a, b)
@@ -1,11 +1,11 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 import json
 import os
 from database import FirebaseManager
 
 # from ai_layer.pipeline import run as ai_pipeline
-# from ai_layer.models import LayerInput
+from ai_layer.models import LayerInput
 from Models import CVRequest, PersonalInfo
 # from cv_generator import save_cv, generate_cv
 
@@ -51,6 +51,33 @@ def post_personal_info(request: PersonalInfo):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@app.post('/tailor/stream')
+async def tailor_stream(request: LayerInput):
+    """
+    Server-Sent Events: one `experience` / `project` event per tailored section
+    as soon as it is ready, then a `summary` event with the full LayerOutput.
+    """
+    # imported on first request: the pipeline needs OPENAI_API_KEY and opens its caches
+    from ai_layer.pipeline import tailor_profile_stream_async
+
+    async def events():
+        try:
+            async for ev in tailor_profile_stream_async(request):
+                yield sse(ev['event'], ev)
+        except Exception as e:
+            yield sse('error', {'detail': str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 # @app.post('/job-description')
 # async def post_job_description(description: str, file_path="generated/personal_info.json"):
 #     """
@@ -2,6 +2,7 @@ from openai import OpenAI
 import os
 from dotenv import load_dotenv
 load_dotenv()
+from ai_layer.jd_cache import jd_analysis
 
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
@@ -24,9 +25,17 @@ def get_job_description():
         return "\n".join(lines)
 
 def analyze_job_description(job_description):
-    """Analyze job description to extract key requirements and skills."""
+    """
+    Analyze job description to extract key requirements and skills.
+    Results are cached per normalized JD text (ai_layer/jd_cache.py), so a
+    re-posted or re-submitted JD costs no new LLM call within the TTL.
+    """
+    model = os.environ.get("MODEL_NAME")
+    return jd_analysis(job_description, lambda text: _analyze_job_description(text, model), model=model)
+
+def _analyze_job_description(job_description, model):
     response = client.chat.completions.create(
-        model=os.environ.get("MODEL_NAME"),
+        model=model,
         messages=[
             {"role": "system", "content": "Analyze the job description and extract key information. Format the output as JSON with the following fields: job_title, required_skills (array), preferred_skills (array), responsibilities (array), qualifications (array), keywords (array of important terms)."},
             {"role": "user", "content": job_description}